@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+
+from src.bench import macro, micro, scaling
+from src.bench.generator import ProgramShape, generate_program
+from src.bench.workloads import WORKLOADS
+from src.config.definitions import BASELINE_FILE, MICRO_BASELINE_FILE
+
+
+def run_macro(args) -> int:
+    names = args.workloads.split(',') if args.workloads else list(WORKLOADS)
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        print(f'Unknown workloads: {", ".join(unknown)}, available: {", ".join(WORKLOADS)}')
+        return 2
+
+    cases = []
+    for name in names:
+        sizes = WORKLOADS[name].sizes
+        cases += [(name, size) for size in (sizes[:2] if args.quick else sizes)]
+
+    options = {'compiled': args.aot, 'jit': not args.nojit}
+    try:
+        results = macro.run_suite(cases, repeat=args.repeat, isolate=not args.no_isolate, **options)
+    except macro.BenchmarkError as error:
+        print(f'Benchmark failed: {error}')
+        return 1
+
+    baseline = macro.load_results(args.baseline) if os.path.exists(args.baseline) else None
+    print(macro.report(results, baseline))
+
+    if args.output:
+        macro.save_results(args.output, results)
+    if args.save_baseline:
+        macro.save_results(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if baseline is None:
+        print(f'No baseline at {args.baseline}, run with --save-baseline to create it')
+        return 0
+
+    return check_baseline(results, baseline, args.tolerance)
+
+
+def run_micro(args) -> int:
+    names = args.operations.split(',') if args.operations else list(micro.BENCHMARKS)
+    unknown = [name for name in names if name not in micro.BENCHMARKS]
+    if unknown:
+        print(f'Unknown operations: {", ".join(unknown)}, available: {", ".join(micro.BENCHMARKS)}')
+        return 2
+
+    results = micro.run_benchmarks(names, repetitions=args.count, repeat=args.repeat, jit=args.jit)
+    baseline = macro.load_results(args.baseline) if os.path.exists(args.baseline) else None
+    print(micro.report(results, baseline))
+
+    if args.output:
+        macro.save_results(args.output, results)
+    if args.save_baseline:
+        macro.save_results(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if baseline is None:
+        return 0
+    return check_baseline(results, baseline, args.tolerance, micro.GATED_METRICS)
+
+
+def run_scaling(args) -> int:
+    shape = ProgramShape(args.functions, args.globals, args.classes, args.loop_depth, args.arrays, args.array_size,
+                         args.statements)
+    factors = [int(factor) for factor in args.factors.split(',')]
+    if args.generate:
+        with open(args.generate, 'w') as file:
+            file.write(generate_program(shape.scaled(factors[-1], args.scale_arrays)))
+        print(f'Program saved to {args.generate}')
+        return 0
+
+    results = scaling.run_scaling(shape, factors, args.scale_arrays)
+    print(scaling.report(results, args.threshold))
+    if args.output:
+        macro.save_results(args.output, {str(factor): result for factor, result in results.items()})
+
+    flagged = scaling.superlinear(scaling.growth(results), args.threshold)
+    for name in flagged:
+        print(f'SUPERLINEAR {name}')
+    return 1 if flagged and args.strict else 0
+
+
+def check_baseline(results, baseline, tolerance, metrics=None) -> int:
+    regressions = macro.compare(results, baseline, tolerance, metrics)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m src.bench', description='Typeton benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    macro_parser = commands.add_parser('macro', help='compile and run the sample programs at several sizes')
+    macro_parser.add_argument('--workloads', help=f'comma separated, any of {",".join(WORKLOADS)}')
+    macro_parser.add_argument('--quick', action='store_true', help='only the two smallest sizes')
+    macro_parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest is kept')
+    macro_parser.add_argument('--aot', action='store_true', help='run compiled to Python ahead of time')
+    macro_parser.add_argument('--nojit', action='store_true', help='interpret every quad')
+    macro_parser.add_argument('--no-isolate', action='store_true', help='run every case in this process')
+    macro_parser.add_argument('--output', help='save the results as JSON')
+    macro_parser.add_argument('--baseline', default=BASELINE_FILE, help='results to compare against')
+    macro_parser.add_argument('--save-baseline', action='store_true', help='replace the baseline with this run')
+    macro_parser.add_argument('--tolerance', type=float, default=0.1,
+                              help='allowed slowdown before failing, 0.1 is 10%% (default)')
+    macro_parser.set_defaults(run=run_macro)
+
+    micro_parser = commands.add_parser('micro', help='time single operations through the virtual machine')
+    micro_parser.add_argument('--operations', help=f'comma separated, any of {",".join(micro.BENCHMARKS)}')
+    micro_parser.add_argument('--count', type=int, default=10000, help='repetitions of the operation per run')
+    micro_parser.add_argument('--repeat', type=int, default=5, help='runs per operation, the fastest is kept')
+    micro_parser.add_argument('--jit', action='store_true', help='keep the JIT on')
+    micro_parser.add_argument('--output', help='save the results as JSON')
+    micro_parser.add_argument('--baseline', default=MICRO_BASELINE_FILE, help='results to compare against')
+    micro_parser.add_argument('--save-baseline', action='store_true', help='replace the baseline with this run')
+    micro_parser.add_argument('--tolerance', type=float, default=0.2,
+                              help='allowed slowdown before failing, 0.2 is 20%% (default)')
+    micro_parser.set_defaults(run=run_micro)
+
+    scaling_parser = commands.add_parser('scaling', help='compile generated programs of growing size')
+    scaling_parser.add_argument('--factors', default='1,2,4,8', help='sizes, as multiples of the base program')
+    scaling_parser.add_argument('--functions', type=int, default=10)
+    scaling_parser.add_argument('--globals', type=int, default=10)
+    scaling_parser.add_argument('--classes', type=int, default=2)
+    scaling_parser.add_argument('--loop-depth', type=int, default=2)
+    scaling_parser.add_argument('--arrays', type=int, default=2, help='array declarations per function')
+    scaling_parser.add_argument('--array-size', type=int, default=10)
+    scaling_parser.add_argument('--statements', type=int, default=4, help='statements inside the innermost loop')
+    scaling_parser.add_argument('--scale-arrays', action='store_true', help='also multiply the array sizes')
+    scaling_parser.add_argument('--threshold', type=float, default=1.2,
+                                help='growth exponent flagged as superlinear (default 1.2)')
+    scaling_parser.add_argument('--strict', action='store_true', help='fail when something grows superlinearly')
+    scaling_parser.add_argument('--output', help='save the results as JSON')
+    scaling_parser.add_argument('--generate', help='only save the largest program to this file')
+    scaling_parser.set_defaults(run=run_scaling)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
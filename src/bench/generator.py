@@ -0,0 +1,120 @@
+"""
+Synthetic Typeton programs of any size, built only from constructs the sample programs use.
+Every generated program compiles and runs, main prints the sum of every function result. Each call
+allocates an object, the heap grows to hold them.
+"""
+from typing import List
+
+# Globals share the 499 addresses of each type
+MAX_GLOBALS = 400
+CALLS_PER_DRIVER = 50
+
+
+class ProgramShape:
+    def __init__(self, functions=10, globals_=10, classes=2, loop_depth=2, arrays=2, array_size=10, statements=4):
+        self.functions = functions
+        self.globals_ = min(globals_, MAX_GLOBALS)
+        self.classes = max(classes, 1)
+        self.loop_depth = loop_depth
+        self.arrays = arrays
+        self.array_size = array_size
+        self.statements = statements
+
+    def scaled(self, factor: int, arrays=False) -> 'ProgramShape':
+        """
+        `factor` times as many functions, globals and classes. With `arrays` the arrays also get `factor`
+        times longer, so work done per array element grows faster than the source
+        """
+        return ProgramShape(self.functions * factor, self.globals_ * factor, self.classes * factor,
+                            self.loop_depth, self.arrays, self.array_size * (factor if arrays else 1),
+                            self.statements)
+
+
+def _class(index: int) -> List[str]:
+    return [
+        f'class C{index} {{',
+        f'    next: C{index}',
+        '    name: String',
+        '    value: Int',
+        '    ratio: Float',
+        '}',
+        '',
+    ]
+
+
+def _function(index: int, shape: ProgramShape) -> List[str]:
+    class_name = f'C{index % shape.classes}'
+    lines = [
+        f'func f{index}(n: Int) -> Int {{',
+        '    var a: Int',
+        '    var x: Float',
+        f'    var o: {class_name}',
+    ]
+    lines += [f'    var arr{array}: Int[{shape.array_size}]' for array in range(shape.arrays)]
+    lines += [f'    var i{depth}: Int' for depth in range(shape.loop_depth)]
+    lines += [
+        '',
+        f'    o = new {class_name}()',
+        '    o.value = n',
+        f'    o.name = "f{index % 100}"',
+        '    a = 0',
+        '    x = 0.5',
+    ]
+
+    indent = '    '
+    for depth in range(shape.loop_depth):
+        lines += [f'{indent}i{depth} = 0', f'{indent}while (i{depth} < {2 + depth}) {{']
+        indent += '    '
+
+    global_index = index % shape.globals_ if shape.globals_ else None
+    for statement in range(shape.statements):
+        counter = f'i{statement % shape.loop_depth}' if shape.loop_depth else '1'
+        kind = statement % 4
+        if kind == 0:
+            lines.append(f'{indent}a = a + {counter} * {statement + 2} - o.value')
+        elif kind == 1 and shape.arrays:
+            array = f'arr{statement % shape.arrays}'
+            lines += [f'{indent}{array}[{counter} + 1] = a + n',
+                      f'{indent}a = a + {array}[{counter} + 1] - n']
+        elif kind == 2:
+            lines += [f'{indent}if (a > 1000) {{', f'{indent}    a = a - 1000', f'{indent}}} else {{',
+                      f'{indent}    x = x * 1.5', f'{indent}}}']
+        elif global_index is not None:
+            lines.append(f'{indent}g{global_index} = g{global_index} + {statement}')
+        else:
+            lines.append(f'{indent}o.value = o.value + {statement}')
+
+    for depth in reversed(range(shape.loop_depth)):
+        lines += [f'{indent}i{depth} += 1']
+        indent = indent[:-4]
+        lines.append(f'{indent}}}')
+
+    lines += [f'    delete arr{array}' for array in range(shape.arrays)]
+    lines += ['    return a', '}', '']
+    return lines
+
+
+def generate_program(shape: ProgramShape) -> str:
+    lines = []
+    for index in range(shape.classes):
+        lines += _class(index)
+
+    lines += [f'var g{index}: Int' for index in range(shape.globals_)]
+    lines.append('')
+
+    for index in range(shape.functions):
+        lines += _function(index, shape)
+
+    # temporaries of a function share 499 addresses per type, so the calls are split between drivers
+    drivers = range(0, shape.functions, CALLS_PER_DRIVER)
+    for driver in drivers:
+        lines += [f'func run{driver}() -> Int {{', '    var total: Int', '    total = 0']
+        lines += [f'    total = total + f{index}({index % 7})'
+                  for index in range(driver, min(driver + CALLS_PER_DRIVER, shape.functions))]
+        lines += ['    return total', '}', '']
+
+    lines += ['func main() -> {', '    var total: Int', '    total = 0']
+    lines += [f'    g{index} = 0' for index in range(shape.globals_)]
+    lines += [f'    total = total + run{driver}()' for driver in drivers]
+    lines += ['    print(total)', '}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,153 @@
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional, Tuple
+
+from src.bench.workloads import WORKLOADS, Workload
+from src.utils.display import make_table, TableOptions
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+# Metrics where a bigger value is worse, compared against the baseline
+GATED_METRICS = ['compile_seconds', 'run_seconds', 'operations', 'peak_rss_kb']
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def case_name(workload: str, size: int) -> str:
+    return f'{workload}/{size}'
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB everywhere else
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def printed_result(output: str) -> Optional[str]:
+    lines = [line for line in output.splitlines() if line.strip()]
+    if 'Main function ended' not in lines:
+        return None
+    end = lines.index('Main function ended')
+    return lines[end - 1] if end > 0 else None
+
+
+def run_case(workload: Workload, size: int, repeat: int = 3, **options) -> Dict:
+    """Compiles and runs one workload size `repeat` times, keeps the fastest compile and run"""
+    from src.compiler import Compiler
+    from src.virtual_machine import VirtualMachine
+
+    source = workload.source(size)
+    expected = workload.checksum(size)
+    compile_seconds = run_seconds = float('inf')
+    operations = 0
+
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            compiler = Compiler()
+            start = time.perf_counter()
+            program = compiler.compile(source)
+            compile_seconds = min(compile_seconds, time.perf_counter() - start)
+
+        output = io.StringIO()
+        virtual_machine = VirtualMachine()
+        try:
+            with redirect_stdout(output):
+                start = time.perf_counter()
+                virtual_machine.run(program, **options)
+                run_seconds = min(run_seconds, time.perf_counter() - start)
+        except SystemExit:
+            raise BenchmarkError(f'{case_name(workload.name, size)} stopped: {output.getvalue().strip()[-200:]}')
+
+        result = printed_result(output.getvalue())
+        if result != expected:
+            raise BenchmarkError(f'{case_name(workload.name, size)} printed {result}, expected {expected}')
+        operations = virtual_machine.operation_count
+
+    return {
+        'workload': workload.name,
+        'size': size,
+        'compile_seconds': compile_seconds,
+        'run_seconds': run_seconds,
+        'operations': operations,
+        'ops_per_second': operations / run_seconds if run_seconds else 0,
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+
+def _run_case_by_name(name: str, size: int, repeat: int, options: Dict) -> Dict:
+    return run_case(WORKLOADS[name], size, repeat, **options)
+
+
+def run_suite(cases: List[Tuple[str, int]], repeat: int = 3, isolate: bool = True, **options) -> Dict[str, Dict]:
+    """
+    Runs every (workload, size) case. With `isolate` each case gets a fresh interpreter, so the
+    peak memory belongs to that case only and no JIT or parser state carries over
+    """
+    results = {}
+    if not isolate:
+        for name, size in cases:
+            results[case_name(name, size)] = _run_case_by_name(name, size, repeat, options)
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    for name, size in cases:
+        with context.Pool(1) as pool:
+            results[case_name(name, size)] = pool.apply(_run_case_by_name, (name, size, repeat, options))
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            metrics: List[str] = None) -> List[str]:
+    """Returns a message for every metric worse than the baseline by more than `tolerance` (0.1 is 10%)"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in metrics or GATED_METRICS:
+            current, previous = result.get(metric), reference.get(metric)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + tolerance):
+                regressions.append(f'{name} {metric}: {previous:.6g} -> {current:.6g} '
+                                   f'(+{(current / previous - 1) * 100:.1f}%)')
+    return regressions
+
+
+def load_results(filename: str) -> Dict[str, Dict]:
+    with open(filename) as file:
+        return json.load(file)['results']
+
+
+def save_results(filename: str, results: Dict[str, Dict]):
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'w') as file:
+        json.dump({'python': sys.version.split()[0], 'results': results}, file, indent=2)
+
+
+def report(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]] = None) -> str:
+    def change(name, metric):
+        if not baseline or name not in baseline or not baseline[name].get(metric):
+            return ''
+        return f'{(results[name][metric] / baseline[name][metric] - 1) * 100:+.1f}%'
+
+    rows = [[name, f'{result["compile_seconds"] * 1000:.1f}', f'{result["run_seconds"] * 1000:.1f}',
+             change(name, 'run_seconds'), f'{result["operations"]:,}', f'{result["ops_per_second"]:,.0f}',
+             '-' if result['peak_rss_kb'] is None else f'{result["peak_rss_kb"]:,}']
+            for name, result in results.items()]
+    return make_table('Benchmarks', ['CASE', 'COMPILE MS', 'RUN MS', 'VS BASELINE', 'OPERATIONS', 'OPS/S',
+                                     'PEAK RSS KB'], rows, TableOptions(14, 20))
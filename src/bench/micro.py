@@ -0,0 +1,131 @@
+"""
+Per operation benchmarks: every case is a straight line of the same quad inside `main`, run through the
+Virtual Machine without the JIT. The run time of the same program without the repeated quads is
+subtracted, what remains is the cost of the handler plus the dispatch loop.
+"""
+import os
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List
+
+from src.compiler.code_generator.type import OperationType, Quad
+from src.compiler.output import SIZE_TYPES, OutputFile, encode_program
+from src.compiler.stack_allocator.types import ValueType
+from src.utils.display import make_table, TableOptions
+from src.virtual_machine.types import FunctionData
+
+GATED_METRICS = ['ns_per_op']
+
+# main frame: 3 ints, 3 floats, 1 bool and 1 pointer local, 1 pointer temporary
+INT_A, INT_B, INT_C = 2500, 2501, 2502
+FLOAT_A, FLOAT_B, FLOAT_C = 3000, 3001, 3002
+BOOL_A = 3500
+POINTER_A = 4500
+POINTER_TEMP = 7000
+
+ONE, THREE, FLOAT_ONE, FALSE, TEXT = 7500, 7501, 8000, 8500, 9000
+CONSTANTS = {ONE: 1, THREE: 3, FLOAT_ONE: 1.5, FALSE: 'false', TEXT: 'x'}
+HEAP_START = 9500
+
+MAIN_SIZES = {ValueType.INT: (3, 0), ValueType.FLOAT: (3, 0), ValueType.BOOL: (1, 0), ValueType.POINTER: (1, 1)}
+
+
+class MicroBenchmark:
+    """`body(ip)` returns the quads of one repetition starting at `ip`, which executes `operations` quads"""
+
+    def __init__(self, name: str, body: Callable[[int], List[Quad]], setup: List[Quad] = None,
+                 operations: int = 1):
+        self.name = name
+        self.body = body
+        self.setup = setup or []
+        self.operations = operations
+
+    def program(self, repetitions: int) -> bytes:
+        # void function with one int parameter called by the call benchmark, main is always the last function
+        quads = [Quad(OperationType.END_GLOBAL), Quad(OperationType.ENDFUNC)] + self.setup
+        for _ in range(repetitions):
+            quads += self.body(len(quads))
+        quads.append(Quad(OperationType.ENDFUNC))
+
+        return encode_program(OutputFile(CONSTANTS, {
+            'global': _function_data('global', 0, {}),
+            'f': _function_data('f', 1, {ValueType.INT: (1, 0)}, [ValueType.INT]),
+            'main': _function_data('main', 2, MAIN_SIZES),
+        }, quads, HEAP_START))
+
+
+def _function_data(id_, start_quad, sizes, parameters=None) -> FunctionData:
+    data = FunctionData(id_, start_quad)
+    data.parameter_signature = parameters or []
+    for type_ in SIZE_TYPES:
+        size_unit = data.size_data.get_data(type_)
+        size_unit.local, size_unit.temp = sizes.get(type_, (0, 0))
+    return data
+
+
+def _assign(source, target):
+    return Quad(OperationType.ASSIGN, source, None, target)
+
+
+INTS = [_assign(ONE, INT_A), _assign(ONE, INT_B)]
+FLOATS = [_assign(FLOAT_ONE, FLOAT_A), _assign(FLOAT_ONE, FLOAT_B)]
+OBJECT = [Quad(OperationType.POINTER_ASSIGN, OperationType.ALLOCATE_HEAP, 3, POINTER_A)]
+
+BENCHMARKS: Dict[str, MicroBenchmark] = {benchmark.name: benchmark for benchmark in [
+    MicroBenchmark('add', lambda ip: [Quad(OperationType.ADD, INT_A, INT_B, INT_C)], INTS),
+    MicroBenchmark('add_int', lambda ip: [Quad(OperationType.ADD_INT, INT_A, INT_B, INT_C)], INTS),
+    MicroBenchmark('add_float', lambda ip: [Quad(OperationType.ADD_FLOAT, FLOAT_A, FLOAT_B, FLOAT_C)], FLOATS),
+    MicroBenchmark('assign', lambda ip: [_assign(INT_A, INT_C)], INTS),
+    MicroBenchmark('pointer_add', lambda ip: [Quad(OperationType.POINTER_ADD, f'&{POINTER_A}', f'&{ONE}',
+                                                   f'&{POINTER_TEMP}')], OBJECT),
+    MicroBenchmark('verify', lambda ip: [Quad(OperationType.VERIFY, ONE, None, THREE)]),
+    # a false condition, jumping to the next quad
+    MicroBenchmark('gotof', lambda ip: [Quad(OperationType.GOTOF, BOOL_A, None, ip + 1)], [_assign(FALSE, BOOL_A)]),
+    # ARE + PARAM + GOSUB + ENDFUNC of the callee
+    MicroBenchmark('call', lambda ip: [Quad(OperationType.ARE, None, None, 'f'), Quad(OperationType.PARAM, INT_A, 0),
+                                       Quad(OperationType.GOSUB, None, None, 'f')], INTS, operations=4),
+    MicroBenchmark('print', lambda ip: [Quad(OperationType.PRINT, None, None, TEXT)]),
+    # one cell each, the heap grows as they pile up
+    MicroBenchmark('allocate_heap', lambda ip: [Quad(OperationType.POINTER_ASSIGN, OperationType.ALLOCATE_HEAP, 1,
+                                                     POINTER_A)]),
+]}
+
+
+def _run_seconds(program: bytes, jit: bool) -> float:
+    from src.virtual_machine import VirtualMachine
+
+    virtual_machine = VirtualMachine()
+    # output goes to a null sink, print measures the handler and not the terminal
+    with open(os.devnull, 'w') as null, redirect_stdout(null):
+        virtual_machine.run(program, jit=jit)
+    return virtual_machine.run_seconds
+
+
+def run_benchmark(benchmark: MicroBenchmark, repetitions: int = 10000, repeat: int = 5, jit: bool = False) -> Dict:
+    """Fastest of `repeat` runs, minus the fastest run of the program without the repeated quads"""
+    program, empty = benchmark.program(repetitions), benchmark.program(0)
+    seconds = min(_run_seconds(program, jit) for _ in range(repeat))
+    overhead = min(_run_seconds(empty, jit) for _ in range(repeat))
+
+    operations = repetitions * benchmark.operations
+    return {
+        'operations': operations,
+        'seconds': seconds - overhead,
+        'ns_per_op': max(seconds - overhead, 0) / operations * 1e9,
+        'ns_per_repetition': max(seconds - overhead, 0) / repetitions * 1e9,
+    }
+
+
+def run_benchmarks(names: List[str], repetitions: int = 10000, repeat: int = 5, jit: bool = False) -> Dict[str, Dict]:
+    return {name: run_benchmark(BENCHMARKS[name], repetitions, repeat, jit) for name in names}
+
+
+def report(results: Dict[str, Dict], baseline: Dict[str, Dict] = None) -> str:
+    def change(name):
+        if not baseline or not baseline.get(name, {}).get('ns_per_op'):
+            return ''
+        return f'{(results[name]["ns_per_op"] / baseline[name]["ns_per_op"] - 1) * 100:+.1f}%'
+
+    rows = [[name, f'{result["operations"]:,}', f'{result["ns_per_op"]:.0f}',
+             f'{result["ns_per_repetition"]:.0f}', change(name)] for name, result in results.items()]
+    return make_table('Operations', ['BENCHMARK', 'OPERATIONS', 'NS PER OP', 'NS PER REPEAT', 'VS BASELINE'],
+                      rows, TableOptions(16, 20))
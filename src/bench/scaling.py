@@ -0,0 +1,163 @@
+"""
+Compiler scaling benchmark: compiles generated programs of growing size and reports, for every part of
+the compiler, its time and the memory it still holds after compiling. The grammar actions call into the
+symbol tables and code generator, so time is split by the module of each profiled function instead of
+by compile phase.
+"""
+import cProfile
+import io
+import math
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+from src.bench.generator import ProgramShape, generate_program
+from src.config.definitions import ROOT_DIR
+from src.utils.debug import Debug
+from src.utils.display import make_table, TableOptions
+
+# First matching path prefix (relative to src) names the component
+COMPONENTS = [
+    ('compiler/lexer', 'lexer'),
+    ('compiler/ply/lex.py', 'lexer'),
+    ('compiler/ply/yacc.py', 'parser'),
+    ('compiler/compiler.py', 'parser'),
+    ('compiler/symbol_table', 'symbol tables'),
+    ('compiler/code_generator', 'code generator'),
+    ('compiler/stack_allocator', 'code generator'),
+    ('compiler/output.py', 'serialization'),
+    ('utils/observer.py', 'events'),
+]
+COMPONENT_NAMES = ['lexer', 'parser', 'symbol tables', 'code generator', 'events', 'serialization', 'other']
+
+# Counters expected to grow linearly with the program
+COUNTERS = ['tokens', 'quads', 'temporaries', 'broadcasts', 'debug_map']
+
+# Times below this are mostly noise, their growth is not flagged
+MIN_SECONDS = 0.005
+
+
+def component(filename: str) -> str:
+    path = os.path.relpath(os.path.realpath(filename), ROOT_DIR).replace(os.sep, '/')
+    for prefix, name in COMPONENTS:
+        if path.startswith(prefix):
+            return name
+    return 'other'
+
+
+def _compile(source: str, stats=False):
+    """Returns the compiler and the seconds compile took, building the compiler is not measured"""
+    from src.compiler import Compiler
+
+    compiler = Compiler()
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        compiler.compile(source, stats=stats)
+        return compiler, time.perf_counter() - start
+
+
+def measure(source: str) -> Dict:
+    """Compiles the source three times: timed, tracing memory and under the profiler"""
+    _, seconds = _compile(source)
+
+    Debug.reset()
+    tracemalloc.start()
+    try:
+        compiler, _ = _compile(source, stats=True)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    memory = {name: 0 for name in COMPONENT_NAMES}
+    for statistic in snapshot.statistics('filename'):
+        memory[component(statistic.traceback[0].filename)] += statistic.size
+
+    stats = compiler.stats
+    result = {
+        'lines': source.count('\n'),
+        'seconds': seconds,
+        'tokens': stats.tokens,
+        'quads': stats.quads,
+        'temporaries': stats.temporaries,
+        'broadcasts': stats.broadcasts,
+        # addresses named for debugging, a class attribute that outlives the compiler
+        'debug_map': len(Debug.map()),
+        'peak_bytes': peak,
+        'retained_bytes_by_component': memory,
+    }
+    del compiler, snapshot
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    _compile(source)
+    profiler.disable()
+    times = {name: 0.0 for name in COMPONENT_NAMES}
+    for (filename, _, _), (_, _, own_time, _, _) in pstats.Stats(profiler).stats.items():
+        times[component(filename)] += own_time
+    # the profiler slows every call down, only the share of each component is kept
+    total = sum(times.values()) or 1
+    result['seconds_by_component'] = {name: seconds * time_ / total for name, time_ in times.items()}
+    return result
+
+
+def run_scaling(shape: ProgramShape, factors: List[int], arrays=False) -> Dict[int, Dict]:
+    # the first compile also imports and warms up the compiler
+    _compile(generate_program(shape.scaled(1)))
+    return {factor: measure(generate_program(shape.scaled(factor, arrays))) for factor in factors}
+
+
+def exponent(small: float, large: float, small_size: float, large_size: float) -> float:
+    """Growth of a metric relative to the program size, 1 is linear and 2 quadratic"""
+    if small <= 0 or large <= 0 or small_size == large_size:
+        return 0.0
+    return math.log(large / small) / math.log(large_size / small_size)
+
+
+def growth(results: Dict[int, Dict]) -> Dict[str, float]:
+    """Exponent of every metric between the two largest programs, relative to their token count"""
+    factors = sorted(results)
+    if len(factors) < 2:
+        return {}
+    small, large = results[factors[-2]], results[factors[-1]]
+    sizes = small['tokens'], large['tokens']
+
+    exponents = {'total': exponent(small['seconds'], large['seconds'], *sizes)}
+    for name in COMPONENT_NAMES:
+        if large['seconds_by_component'][name] >= MIN_SECONDS:
+            exponents[name] = exponent(small['seconds_by_component'][name],
+                                       large['seconds_by_component'][name], *sizes)
+        exponents[f'{name} memory'] = exponent(small['retained_bytes_by_component'][name],
+                                               large['retained_bytes_by_component'][name], *sizes)
+    exponents['peak memory'] = exponent(small['peak_bytes'], large['peak_bytes'], *sizes)
+    for counter in COUNTERS[1:]:
+        exponents[counter] = exponent(small[counter], large[counter], *sizes)
+    return exponents
+
+
+def superlinear(exponents: Dict[str, float], threshold: float) -> List[str]:
+    return [name for name, value in exponents.items() if value > threshold]
+
+
+def report(results: Dict[int, Dict], threshold: float) -> str:
+    rows = []
+    for factor, result in sorted(results.items()):
+        components = result['seconds_by_component']
+        rows.append([f'x{factor}', f'{result["lines"]:,}', f'{result["tokens"]:,}',
+                     f'{result["seconds"] * 1000:.0f}',
+                     *[f'{components[name] * 1000:.0f}' for name in COMPONENT_NAMES[:5]],
+                     f'{result["peak_bytes"] / 1024:,.0f}', f'{result["broadcasts"]:,}'])
+    tables = [make_table('Compile Scaling (ms)', ['SIZE', 'LINES', 'TOKENS', 'TOTAL', 'LEXER', 'PARSER', 'SYMBOLS',
+                                                  'CODEGEN', 'EVENTS', 'PEAK KIB', 'BROADCASTS'],
+                         rows, TableOptions(11, 20))]
+
+    exponents = growth(results)
+    flagged = set(superlinear(exponents, threshold))
+    rows = [[name, f'{value:.2f}', 'SUPERLINEAR' if name in flagged else '']
+            for name, value in exponents.items()]
+    tables.append(make_table('Growth (exponent vs tokens)', ['METRIC', 'EXPONENT', ''], rows,
+                             TableOptions(24, 20)))
+    return '\n'.join(tables)
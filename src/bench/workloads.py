@@ -0,0 +1,206 @@
+"""
+Scalable versions of the sample programs. Every workload prints a checksum as its last line,
+so a benchmark that stops early or computes the wrong thing fails instead of looking fast.
+"""
+from string import Template
+from typing import Callable, Dict, List
+
+
+class Workload:
+    def __init__(self, name: str, source: str, sizes: List[int], checksum: Callable[[int], str]):
+        self.name = name
+        self.template = Template(source.lstrip())
+        self.sizes = sizes
+        self.checksum = checksum
+
+    def source(self, size: int) -> str:
+        return self.template.substitute(N=size)
+
+
+SORT = '''
+func main() -> {
+    var A: Int[$N]
+    var i: Int
+    var j: Int
+    var temp: Int
+
+    i = 0
+    while (i < $N) {
+        A[i] = $N - i
+        i += 1
+    }
+
+    i = 0
+    while (i < $N) {
+        j = 0
+        while (j < $N - i - 1) {
+            if (A[j] > A[j + 1]) {
+                temp = A[j]
+                A[j] = A[j + 1]
+                A[j + 1] = temp
+            }
+            j += 1
+        }
+        i += 1
+    }
+
+    print(A[0] * 100000 + A[$N - 1])
+}
+'''
+
+MULTMAT = '''
+func main() -> {
+    var M1: Int[$N][$N]
+    var M2: Int[$N][$N]
+    var result: Int[$N][$N]
+    var i: Int
+    var j: Int
+    var k: Int
+    var temp: Int
+    var total: Int
+
+    i = 0
+    while (i < $N) {
+        j = 0
+        while (j < $N) {
+            M1[i][j] = i + j
+            M2[i][j] = i - j
+            j += 1
+        }
+        i += 1
+    }
+
+    total = 0
+    i = 0
+    while (i < $N) {
+        j = 0
+        while (j < $N) {
+            temp = 0
+            k = 0
+            while (k < $N) {
+                temp += M1[i][k] * M2[k][j]
+                k += 1
+            }
+            result[i][j] = temp
+            total += temp
+            j += 1
+        }
+        i += 1
+    }
+
+    print(total)
+}
+'''
+
+FIBO = '''
+func fib_r(n: Int) -> Int {
+    if (n <= 1) {
+        return n
+    }
+    return fib_r(n - 1) + fib_r(n - 2)
+}
+
+func factorial_r(n: Int) -> Int {
+    if (n == 0) {
+        return 1
+    }
+    return n * factorial_r(n - 1)
+}
+
+func main() -> {
+    print(factorial_r(10))
+    print(fib_r($N))
+}
+'''
+
+HEAP = '''
+class Dog {
+    parent: Dog
+    name: String
+    age: Int
+}
+
+func scratch(n: Int) -> Int {
+    var arr: Int[10]
+    arr[9] = n
+    n = arr[9]
+    delete arr
+    return n
+}
+
+func main() -> {
+    var dog: Dog
+    var child: Dog
+    var i: Int
+    var total: Int
+
+    dog = new Dog()
+    dog.age = 0
+    total = 0
+    i = 1
+    while (i < $N) {
+        child = new Dog()
+        child.name = "dog"
+        child.age = scratch(i)
+        child.parent = dog
+        total += child.parent.age
+        dog = child
+        i += 1
+    }
+
+    print(total)
+}
+'''
+
+OBJECTS = '''
+class Dog {
+    parent: Dog
+    name: String
+    age: Int
+}
+
+func main() -> {
+    var son: Dog
+    var dad: Dog
+    var i: Int
+    var total: Int
+
+    son = new Dog()
+    dad = new Dog()
+    son.parent = dad
+    dad.parent = son
+    son.age = 1
+    dad.age = 2
+
+    total = 0
+    i = 0
+    while (i < $N) {
+        son.parent.parent.age = i
+        son.parent.name = "dad"
+        total += son.parent.parent.age + dad.parent.parent.age
+        i += 1
+    }
+
+    print(total)
+}
+'''
+
+
+def _fib(n):
+    previous, current = 0, 1
+    for _ in range(n):
+        previous, current = current, previous + current
+    return previous
+
+
+def _multmat(n):
+    return sum(sum((i + k) * (k - j) for k in range(n)) for i in range(n) for j in range(n))
+
+
+WORKLOADS: Dict[str, Workload] = {workload.name: workload for workload in [
+    Workload('sort', SORT, [10, 100, 1000], lambda n: str(100000 + n)),
+    Workload('multmat', MULTMAT, [4, 16, 32], lambda n: str(_multmat(n))),
+    Workload('fibo', FIBO, [10, 15, 20], lambda n: str(_fib(n))),
+    Workload('heap', HEAP, [10, 100, 1000], lambda n: str((n - 1) * (n - 2) // 2)),
+    Workload('objects', OBJECTS, [10, 100, 1000], lambda n: str(n * (n - 1) // 2 + 2 * n)),
+]}
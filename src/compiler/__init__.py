@@ -1 +1,6 @@
-from .compiler import Compiler
+def __getattr__(name):
+    # Loaded on first use, running a cached program never imports the parser
+    if name == 'Compiler':
+        from .compiler import Compiler
+        return Compiler
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
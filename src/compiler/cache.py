@@ -0,0 +1,131 @@
+import hashlib
+import os
+import struct
+import tempfile
+from typing import Optional
+
+from src.compiler.output import MAGIC, VERSION, OutputFile, decode_program
+from src.config.definitions import CACHE_DIR, ROOT_DIR
+
+# Sources the compiled output depends on, any change to them invalidates every cached program
+COMPILER_SOURCES = [os.path.join(ROOT_DIR, 'compiler'), os.path.join(ROOT_DIR, 'config')]
+
+# Oldest programs are removed once the cache holds more than this
+MAX_ENTRIES = 512
+
+_fingerprint = None
+
+
+def compiler_fingerprint() -> str:
+    """Hash of the compiler sources and the output format version"""
+    global _fingerprint
+    if _fingerprint is not None:
+        return _fingerprint
+
+    digest = hashlib.sha256(f'tyc {VERSION}'.encode())
+    for source in COMPILER_SOURCES:
+        for root, directories, files in os.walk(source):
+            directories.sort()
+            for name in sorted(files):
+                if not name.endswith('.py'):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, ROOT_DIR).encode())
+                with open(path, 'rb') as file:
+                    digest.update(file.read())
+
+    _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+class CompileCache:
+    """
+    Content addressed store of compiled programs: the key of a program is the hash of its source
+    plus the compiler fingerprint, so an entry is never stale, only unused.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_entries: int = MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def key(self, source: str, filename: str = '') -> str:
+        """The file name is part of the key since compiled programs refer to it"""
+        digest = hashlib.sha256(compiler_fingerprint().encode())
+        digest.update(filename.encode('utf-8') + b'\0')
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.tyc')
+
+    def lookup(self, source: str, filename: str = '') -> Optional[OutputFile]:
+        """
+        Returns the compiled program already decoded, so the Virtual Machine doesn't decode it again.
+        None if it has not been compiled yet
+        """
+        path = self.path(self.key(source, filename))
+        try:
+            with open(path, 'rb') as file:
+                program = self.__decode(file.read())
+        except OSError:
+            return None
+
+        # a truncated, corrupted or foreign file is dropped, the program is compiled again
+        if program is None:
+            self.__remove(path)
+            return None
+
+        os.utime(path)
+        return program
+
+    def store(self, source: str, program: bytes, filename: str = '') -> str:
+        """Saves a compiled program, writes are atomic so concurrent runs never read half a file"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(self.key(source, filename))
+
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(program)
+        os.replace(temporary, path)
+
+        self.__prune()
+        return path
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.tyc'):
+                self.__remove(os.path.join(self.directory, name))
+
+    def __prune(self):
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.tyc')]
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(key=self.__last_used)
+        for path in entries[:len(entries) - self.max_entries]:
+            self.__remove(path)
+
+    @staticmethod
+    def __decode(program: bytes) -> Optional[OutputFile]:
+        if not program.startswith(MAGIC):
+            return None
+        try:
+            return decode_program(program)
+        except (struct.error, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def __last_used(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -40,6 +40,7 @@ class ArrayActions(Publisher):
             right_address=size,
             result_address=variable.address_
         )
+        quad.element_type = ValueType(variable.array_type)
 
         self._quad_list.append(quad)
 
@@ -78,7 +79,7 @@ class ArrayActions(Publisher):
         self.broadcast(Event(ArrayEvents.ADD_TEMP, (ValueType.INT, result_address, None)))
 
         quad = Quad(
-            operation=OperationType.MULTIPLY,
+            operation=OperationType.MULTIPLY_INT if left_operand.type_ is ValueType.INT else OperationType.MULTIPLY,
             left_address=left_operand.address,
             right_address=dimension.m_address,
             result_address=result_address
@@ -1,7 +1,5 @@
 from typing import Dict, List
 
-import jsonpickle
-
 from src.compiler.code_generator.array import ArrayActions
 from src.compiler.code_generator.built_in import Builtin_Function_Actions
 from src.compiler.code_generator.conditional import ConditionalActions
@@ -9,7 +7,7 @@ from src.compiler.code_generator.expression import Operand, Operator, Expression
 from src.compiler.code_generator.function import FunctionActions
 from src.compiler.code_generator.loop import LoopActions
 from src.compiler.code_generator.object import ObjectActions
-from src.compiler.code_generator.type import Quad
+from src.compiler.code_generator.type import Quad, QuadList
 from src.compiler.stack_allocator.index import StackAllocator
 from src.compiler.stack_allocator.types import ValueType
 from src.utils.debug import Debug
@@ -20,7 +18,7 @@ class CodeGenerator:
     def __init__(self, stack_allocator: StackAllocator, classes):
         self.__operand_address_stack: List[Operand] = []
         self.__operator_stack: List[Operator] = []
-        self.__quad_list: List[Quad] = []
+        self.__quad_list: QuadList = QuadList()
         self.pointer_types: Dict[str, ValueType] = {}
 
         self.scheduler = stack_allocator
@@ -42,7 +40,8 @@ class CodeGenerator:
         )
         self.function_actions = FunctionActions(
             self.__quad_list,
-            self.__operand_address_stack
+            self.__operand_address_stack,
+            self.scheduler
         )
         self.loop_actions = LoopActions(self.__quad_list)
         self.builtin_actions = Builtin_Function_Actions(self.__quad_list)
@@ -69,6 +68,10 @@ class CodeGenerator:
             r += operator.type_.value + " "
         print(r)
 
+    def set_line(self, line: int):
+        """Source line of the quads emitted from now on"""
+        self.__quad_list.line = line
+
     def get_next_quad(self):
         return len(self.__quad_list)
 
@@ -170,6 +173,6 @@ class CodeGenerator:
         self.builtin_actions.execute_call(self.__operator_stack, self.__operand_address_stack, self.scheduler)
 
     def get_output_quads(self):
-        """ Returns quads list of types [str, str, str, str] used by the output file """
+        """ Returns quads list used by the output file """
 
-        return jsonpickle.encode(self.__quad_list)
+        return list(self.__quad_list)
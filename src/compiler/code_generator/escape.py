@@ -0,0 +1,82 @@
+from bisect import bisect_left
+from typing import Callable, List, Tuple
+
+from src.compiler.code_generator.type import OperationType, Quad
+
+"""
+Escape analysis of the arrays and objects a function allocates
+"""
+
+# Quads whose result is a quad or a function instead of an address
+JUMPS = {OperationType.GOTO, OperationType.GOTOF, OperationType.GOTOV, OperationType.GOSUB, OperationType.ARE,
+         OperationType.ERA}
+
+
+def _address(operand):
+    """Address an operand reads or writes, None for anything else"""
+    if type(operand) is str and operand[:1] in ('&', '*') and operand[1:].isdigit():
+        return int(operand[1:])
+    return operand if type(operand) is int else None
+
+
+def local_blocks(quads: List[Quad], start: int, is_local: Callable[[int], bool]) -> List[Tuple[int, int]]:
+    """
+    (allocation, address) of every local pointer of the function starting at `start` whose block never
+    escapes it, in allocation order.
+
+    A pointer qualifies when a single quad allocates its block right into it, so no earlier block is left
+    behind, it is only read as the base of an element or a field, it is never deleted by hand, and its
+    allocation runs before every quad after it.
+    Objects with pointer fields are left out, releasing them releases the blocks their fields point to.
+    """
+    allocations = {}
+    escaped = set()
+    # furthest quad a jump seen so far goes to, the quads before it may be skipped
+    furthest = start
+    for index in range(start, len(quads)):
+        quad = quads[index]
+        operation = quad.operation
+        if operation in JUMPS and type(quad.result_address) is int:
+            furthest = max(furthest, quad.result_address)
+
+        if operation is OperationType.POINTER_ASSIGN and quad.left_address is OperationType.ALLOCATE_HEAP \
+                and type(quad.result_address) is int:
+            if quad.pointer_offsets or quad.result_address in allocations or furthest > index:
+                escaped.add(quad.result_address)
+            else:
+                allocations[quad.result_address] = index
+            continue
+
+        operands = [quad.left_address, quad.right_address]
+        if operation not in JUMPS:
+            operands.append(quad.result_address)
+        if operation is OperationType.POINTER_ADD and type(quad.left_address) is str \
+                and quad.left_address.startswith('&'):
+            # base address of an element or a field
+            operands.pop(0)
+
+        for operand in operands:
+            address = _address(operand)
+            if address is not None:
+                escaped.add(address)
+
+    return sorted((index, address) for address, index in allocations.items()
+                  if address not in escaped and is_local(address))
+
+
+def release_local_blocks(quads: List[Quad], start: int, blocks: List[Tuple[int, int]]):
+    """
+    Appends a DELETE_REF for every block, last allocated first, and turns every ENDFUNC of the function into a
+    jump to the first DELETE_REF of the blocks allocated before it. The caller appends the final ENDFUNC.
+    """
+    release_start = len(quads)
+    for _, address in reversed(blocks):
+        quads.append(Quad(OperationType.DELETE_REF, result_address=address))
+
+    allocations = [index for index, _ in blocks]
+    for index in range(start, release_start):
+        quad = quads[index]
+        allocated = bisect_left(allocations, index)
+        if quad.operation is OperationType.ENDFUNC and allocated:
+            quad.operation = OperationType.GOTO
+            quad.result_address = release_start + len(blocks) - allocated
@@ -7,7 +7,7 @@ from src.compiler.stack_allocator.index import StackAllocator
 from src.compiler.stack_allocator.helpers import Layers
 from src.compiler.stack_allocator.types import ValueType
 from src.compiler.code_generator.type import Operand, Operator, FunctionTableEvents
-from src.compiler.code_generator.type import Quad, OperationType
+from src.compiler.code_generator.type import Quad, OperationType, typed_arithmetic
 from src.compiler.errors import CompilerError, CompilerEvent
 from src.compiler.symbol_table.constant_table.constant_table import ConstantTable
 from src.compiler.symbol_table.function_table.function_table import PRIMITIVE_TYPES
@@ -296,7 +296,7 @@ class ExpressionActions(Publisher, Subscriber):
                 )
             )
 
-        temp_quad = Quad(operation=operator_type,
+        temp_quad = Quad(operation=typed_arithmetic(operator_type, ValueType(type_match)),
                          left_address=assignment.address,
                          right_address=expression.address,
                          result_address=temp_address)
@@ -387,7 +387,7 @@ class ExpressionActions(Publisher, Subscriber):
         quad = (Quad(
             left_address=left.address,
             right_address=right.address,
-            operation=operator.type_,  # convert to type for easy identification in vm
+            operation=typed_arithmetic(operator.type_, ValueType(type_match)),  # typed for the vm
             result_address=result))
 
         self.quad_list.append(quad)
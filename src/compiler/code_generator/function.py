@@ -1,13 +1,17 @@
 from src.compiler.stack_allocator.types import ValueType
 
+from src.compiler.code_generator.escape import local_blocks, release_local_blocks
 from src.compiler.code_generator.type import Quad, OperationType, Operand
+from src.compiler.stack_allocator.helpers import Layers
+from src.compiler.stack_allocator.index import StackAllocator
 from src.compiler.errors import CompilerError, CompilerEvent
 from src.utils.observer import Subscriber, Event, Publisher
 
 
 class FunctionActions(Publisher, Subscriber):
-    def __init__(self, quad_list, operand_list):
+    def __init__(self, quad_list, operand_list, stack_allocator: StackAllocator):
         super().__init__()
+        self.stack_allocator = stack_allocator
 
         self.operand_list = operand_list
         self.parameter_counter = 0
@@ -15,7 +19,7 @@ class FunctionActions(Publisher, Subscriber):
 
     def handle_event(self, event: Event):
         if event.type_ is CompilerEvent.GEN_END_FUNC:
-            self.generate_end_function()
+            self.generate_end_function(event.payload)
         elif event.type_ is CompilerEvent.GO_TO_MAIN:
             self.generate_go_to_main()
         elif event.type_ is CompilerEvent.GENERATE_ARE:
@@ -27,10 +31,18 @@ class FunctionActions(Publisher, Subscriber):
         quad = Quad(operation=OperationType.END_GLOBAL)
         self.quad_list.append(quad)
 
-    def generate_end_function(self):
+    def generate_end_function(self, start):
+        """ Releases the arrays and objects that never leave the function at each of its exits, then ends it """
+        blocks = local_blocks(self.quad_list, start, self.__is_local)
+        if blocks:
+            release_local_blocks(self.quad_list, start, blocks)
+
         quad = Quad(operation=OperationType.ENDFUNC)
         self.quad_list.append(quad)
 
+    def __is_local(self, address):
+        return self.stack_allocator.is_segment(address, Layers.LOCAL)
+
     def generate_go_to_main(self):
         quad = Quad(operation=OperationType.GOTO, result_address="main")
         self.quad_list.insert(0, quad)
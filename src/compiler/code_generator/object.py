@@ -156,6 +156,7 @@ class ObjectActions(Publisher):
 
         quad = Quad(OperationType.POINTER_ASSIGN, left_address=OperationType.ALLOCATE_HEAP, right_address=variable.size,
                     result_address=operand.address)
+        quad.pointer_offsets = variable.pointer_offsets()
 
         self.quad_list.append(quad)
         self.pointer_types[operand.address] = var.class_id
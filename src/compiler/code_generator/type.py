@@ -16,6 +16,14 @@ class OperationType(Enum):
     MULTIPLY = '*'
     DIVIDE = '/'
     ADD = '+'
+    ADD_INT = 'addint'
+    ADD_FLOAT = 'addfloat'
+    SUBTRACT_INT = 'subint'
+    SUBTRACT_FLOAT = 'subfloat'
+    MULTIPLY_INT = 'mulint'
+    MULTIPLY_FLOAT = 'mulfloat'
+    DIVIDE_INT = 'divint'
+    DIVIDE_FLOAT = 'divfloat'
     EQUAL = '=='
     AND = '&&'
     OR = '||'
@@ -47,6 +55,24 @@ class OperationType(Enum):
     INPUT = 'input'
 
 
+# Arithmetic specialized by result type, so the virtual machine neither looks up nor converts types
+TYPED_ARITHMETIC = {
+    (OperationType.ADD, ValueType.INT): OperationType.ADD_INT,
+    (OperationType.ADD, ValueType.FLOAT): OperationType.ADD_FLOAT,
+    (OperationType.SUBTRACT, ValueType.INT): OperationType.SUBTRACT_INT,
+    (OperationType.SUBTRACT, ValueType.FLOAT): OperationType.SUBTRACT_FLOAT,
+    (OperationType.MULTIPLY, ValueType.INT): OperationType.MULTIPLY_INT,
+    (OperationType.MULTIPLY, ValueType.FLOAT): OperationType.MULTIPLY_FLOAT,
+    (OperationType.DIVIDE, ValueType.INT): OperationType.DIVIDE_INT,
+    (OperationType.DIVIDE, ValueType.FLOAT): OperationType.DIVIDE_FLOAT,
+}
+
+
+def typed_arithmetic(operation: OperationType, result_type: ValueType) -> OperationType:
+    """Returns the typed variant of an arithmetic operation, or the operation itself if there is none"""
+    return TYPED_ARITHMETIC.get((operation, result_type), operation)
+
+
 class FunctionTableEvents(Enum):
     ADD_TEMP = 0
 
@@ -77,6 +103,11 @@ class Quad:
         self.left_address = left_address
         self.right_address = right_address
         self.result_address = result_address
+        self.line = None
+        # offsets of the fields that hold pointers, in the block an ALLOCATE_HEAP quad allocates
+        self.pointer_offsets = ()
+        # type of the elements of the array an ALLOCATE_HEAP quad allocates, None for objects
+        self.element_type = None
 
     def display(self, index):
         # unwrap None values
@@ -88,3 +119,15 @@ class Quad:
                                                      left_address if self.left_address is not None else '',
                                                      right_address if self.right_address is not None else '',
                                                      self.result_address if self.result_address is not None else ''))
+
+
+class QuadList(list):
+    """Quads emitted by every action class, each one is stamped with the source line being parsed"""
+
+    def __init__(self):
+        super().__init__()
+        self.line = None
+
+    def append(self, quad: Quad):
+        quad.line = self.line
+        super().append(quad)
@@ -1,24 +1,31 @@
+from contextlib import nullcontext
 from distutils.errors import CompileError
 import sys
-
-import jsonpickle
+import time
+import tracemalloc
 
 from src.compiler.code_generator.code_generator import CodeGenerator
 from src.compiler.code_generator.type import Dimension, Operand, OperationType, Quad
 from src.compiler.errors import CompilerError, CompilerEvent
-from src.compiler.lexer import lex, tokens
+from src.compiler.lexer import lex, tokens, TrackedLexer
 from src.compiler.ply import yacc
 from src.compiler.stack_allocator.helpers import Layers
 from src.compiler.stack_allocator.index import StackAllocator
 from src.compiler.stack_allocator.types import ValueType
-from .output import OutputFile
+from src.config.definitions import PARSER_TABLES_FILE
+from .output import OutputFile, encode_program
+from .stats import CompileStats, TimedLexer
 from .symbol_table import SymbolTable
 from .symbol_table.class_table import ClassTable
 from ..utils.observer import Subscriber, Event, Publisher
 
 
 class Compiler(Publisher, Subscriber):
-    def __init__(self):
+    def __init__(self, debug=False):
+        """
+        :param debug: builds the parse tables from the grammar and writes compiler.out, instead of using the
+                      saved tables
+        """
         super().__init__()
 
         self._allocator = StackAllocator()
@@ -26,7 +33,10 @@ class Compiler(Publisher, Subscriber):
 
         self.tokens = tokens
         self.lexer = lex
-        self._parser = yacc.yacc(module=self, start="program", debug=True)
+        start = time.perf_counter()
+        self._parser = yacc.yacc(module=self, start="program", debug=debug, picklefile=PARSER_TABLES_FILE)
+        self._parser_seconds = time.perf_counter() - start
+        self.stats: CompileStats = None
         self._code_generator = CodeGenerator(
             self._allocator, self._symbol_table.class_table.classes)
 
@@ -75,37 +85,92 @@ class Compiler(Publisher, Subscriber):
         if event.type_ is CompilerEvent.STOP_COMPILE:
             self.p_error(event.payload)
 
-    def compile(self, data: str, debug=False):
+    def compile(self, data: str, debug=False, stats=False, filename=None):
         """
         Compiles a program.
 
         :param data: program to be compiled
         :param debug: shows compiled programs inner workings if true
-        :return: output json file (ready to be executed by the Virtual Machine)
-        """
-
-        self._parser.parse(data, self.lexer, debug=False)
-
-        if self._symbol_table.function_table.function_data_table.get("main") is None:
-            self.handle_event(Event(CompilerEvent.STOP_COMPILE,
-                              CompilerError("Main function is required")))
+        :param filename: name of the source file, errors and profiles refer to its lines
+        :param stats: records time and peak memory of every phase, and what was produced, in `self.stats`
+        :return: compiled program in the .tyc binary format (ready to be executed by the Virtual Machine)
+        """
+        self.stats = CompileStats() if stats else None
+        start_tracing = stats and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+
+        try:
+            return self.__compile(data, debug, filename)
+        finally:
+            if start_tracing:
+                tracemalloc.stop()
+
+    def __compile(self, data: str, debug, filename):
+        # quads take the line of the last token read, the lexer is shared by every compile
+        self.lexer.lexer.lineno = 1
+        lexer = TrackedLexer(self.lexer, self._code_generator.set_line)
+        if self.stats is not None:
+            self.stats.get_phase('parser construction').seconds = self._parser_seconds
+            lexer = TimedLexer(lexer, self.stats.get_phase('lexing'), self.stats)
+            broadcasts = self.__broadcast_count()
+
+        with self.__measure('parsing') as parsing:
+            self._parser.parse(data, lexer, debug=False)
+
+            if self._symbol_table.function_table.function_data_table.get("main") is None:
+                self.handle_event(Event(CompilerEvent.STOP_COMPILE,
+                                  CompilerError("Main function is required")))
 
         if debug:
-            self._display_tables()
-            self._display_quads()
-            self._symbol_table.class_table.display()
-
-        return self._make_json()
-
-    def _make_json(self):
-        """ Makes output json with all the necessary data for execution in the Virtual Machine"""
+            with self.__measure('display'):
+                self._display_tables()
+                self._display_quads()
+                self._symbol_table.class_table.display()
+
+        with self.__measure('serialization'):
+            output = self._make_output(filename)
+
+        if self.stats is not None:
+            # tokens are pulled by the parser, its time includes theirs
+            parsing.seconds -= self.stats.get_phase('lexing').seconds
+            self.stats.broadcasts = self.__broadcast_count() - broadcasts
+            self.__count_output()
+
+        return output
+
+    def __broadcast_count(self):
+        """Broadcasts of the compiler and its tables and actions, the virtual machine keeps its own"""
+        code_generator = self._code_generator
+        publishers = [self, self._allocator, self._symbol_table.function_table, self._symbol_table.class_table,
+                      self._symbol_table.constant_table, code_generator.object_actions,
+                      code_generator.expression_actions, code_generator.array_actions,
+                      code_generator.function_actions, code_generator.loop_actions, code_generator.builtin_actions]
+        return sum(publisher.broadcast_count for publisher in publishers)
+
+    def __measure(self, phase):
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.measure(phase)
+
+    def __count_output(self):
+        function_data_table = self._symbol_table.function_table.function_data_table
+        self.stats.quads = len(self._code_generator.get_output_quads())
+        self.stats.constants = len(self._symbol_table.constant_table.inverse_hash)
+        self.stats.functions = len(function_data_table)
+        self.stats.temporaries = sum(size_unit.temp
+                                     for function_data in function_data_table.values()
+                                     for size_unit in function_data.size_data.hash.values())
+
+    def _make_output(self, filename=None):
+        """ Makes output binary with all the necessary data for execution in the Virtual Machine"""
         constant_table = self._symbol_table.constant_table
         quads = self._code_generator.get_output_quads()
         function_data = self._symbol_table.function_table.get_output_function_data()
 
-        output = OutputFile(constant_table, function_data,
-                            quads, self._allocator._segments[Layers.CONSTANT.value].end+1)
-        return jsonpickle.encode(output)
+        output = OutputFile(constant_table.inverse_hash, function_data,
+                            quads, self._allocator._segments[Layers.CONSTANT.value].end+1, filename)
+        return encode_program(output)
 
     def _display_tables(self):
         self._symbol_table.function_table.display(debug=True)
@@ -1 +1 @@
-from .lexer import lex, tokens
+from .lexer import lex, tokens, TrackedLexer
@@ -159,3 +159,23 @@ def t_error(t):
 
 
 lexer = lex.lex()
+
+
+class TrackedLexer:
+    """Forwards the tokens of a lexer, reporting the source line of every token it returns"""
+
+    def __init__(self, lexer, on_line):
+        self._lexer = lexer
+        self._on_line = on_line
+
+    def input(self, data):
+        self._lexer.input(data)
+
+    def token(self):
+        token = self._lexer.token()
+        if token is not None:
+            self._on_line(token.lineno)
+        return token
+
+    def __getattr__(self, name):
+        return getattr(self._lexer, name)
@@ -1,13 +1,251 @@
-from typing import List, Dict
+"""
+Binary compiled program (.tyc), every section is a run of fixed width little endian records:
 
-from src.compiler.code_generator.type import Quad
-from src.compiler.symbol_table.constant_table import ConstantTable
-from src.virtual_machine.types import FunctionData
+    header
+    strings      offsets (count + 1) * u32, utf-8 bytes, padding to 4 bytes
+    operations   u32 string index per opcode
+    quads        opcode u8, 3 * operand kind u8, 3 * operand value i32
+    constants    address i32, kind u8, value i64 / f64 / string index, Ints past 64 bits as their decimal string
+    functions    name u32, start quad u32, type i8, parameter count u16, first parameter u32, 2 * u16 per type
+    parameters   u8 type index
+    lines        source line u32 per quad, 0 when unknown
+    pointers     quad u32, field offset u32 for every pointer field of the blocks allocation quads allocate
+    elements     quad u32, type u32 for every allocation quad of an array
+"""
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.compiler.code_generator.type import OperationType
+from src.compiler.stack_allocator.types import ValueType
+from src.virtual_machine.types import FunctionData, PointerAction
+
+
+MAGIC = b'TYC\0'
+VERSION = 5
+
+HEADER = struct.Struct('<4sHxxIiIIIIIIII')
+POINTER_FIELD = struct.Struct('<II')
+ELEMENT_TYPE = struct.Struct('<II')
+OFFSET = struct.Struct('<I')
+QUAD = struct.Struct('<4B3i')
+CONSTANT_INT = struct.Struct('<iB3xq')
+CONSTANT_FLOAT = struct.Struct('<iB3xd')
+FUNCTION = struct.Struct('<IIbxHI10H')
+
+# operand kinds
+NONE = 0
+LITERAL = 1
+REFERENCE = 2
+VALUE = 3
+OPERATION = 4
+NAME = 5
+
+# constant kinds
+INT_CONSTANT = 0
+FLOAT_CONSTANT = 1
+STRING_CONSTANT = 2
+BIG_INT_CONSTANT = 3
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+VALUE_TYPES = list(ValueType)
+SIZE_TYPES = [ValueType.INT, ValueType.FLOAT, ValueType.BOOL, ValueType.STRING, ValueType.POINTER]
 
 
 class OutputFile:
-    def __init__(self, constant_table, function_data, quad_list, heap_start):
-        self.constant_table: ConstantTable = constant_table
+    """
+    Everything the Virtual Machine needs to run a program. Decoded quads are (operation, left, right, result)
+    tuples, where pointer operands are (PointerAction, address) and every other operand is a plain value
+    """
+
+    def __init__(self, constants, function_data, quad_list, heap_start, source=None, lines=None,
+                 pointer_offsets=None, element_types=None):
+        self.constants: Dict[int, Any] = constants
         self.function_data: Dict[str, FunctionData] = function_data
-        self.quad_list: List[Quad] = quad_list
+        self.quad_list: List = quad_list
         self.heap_start = heap_start
+
+        # name of the source file and the source line of every quad
+        self.source: Optional[str] = source
+        self.lines: Optional[List[int]] = lines
+        # quad index -> offsets of the pointer fields of the block it allocates, only when it has any
+        self.pointer_offsets: Dict[int, Tuple[int, ...]] = pointer_offsets or {}
+        # quad index -> type of the elements of the array it allocates
+        self.element_types: Dict[int, ValueType] = element_types or {}
+
+
+class StringTable:
+    def __init__(self):
+        self.strings: List[str] = []
+        self.indexes: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        if value not in self.indexes:
+            self.indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return self.indexes[value]
+
+    def encode(self) -> bytes:
+        data = [value.encode('utf-8') for value in self.strings]
+        offsets = [0]
+        for value in data:
+            offsets.append(offsets[-1] + len(value))
+
+        body = b''.join(data)
+        padding = b'\0' * (-len(body) % 4)
+        return struct.pack(f'<{len(offsets)}I', *offsets) + body + padding
+
+
+def _encode_operand(value, strings: StringTable, opcodes: Dict[OperationType, int]) -> Tuple[int, int]:
+    if value is None:
+        return NONE, 0
+    if isinstance(value, OperationType):
+        return OPERATION, opcodes[value]
+    if type(value) is int:
+        return LITERAL, value
+    if value[0] == '&':
+        return REFERENCE, int(value[1:])
+    if value[0] == '*':
+        return VALUE, int(value[1:])
+    if value.isdigit():
+        return LITERAL, int(value)
+    return NAME, strings.add(value)
+
+
+def encode_program(program: OutputFile) -> bytes:
+    """Packs a compiled program (with Quad objects) into the .tyc binary format"""
+    strings = StringTable()
+    operations = list(OperationType)
+    opcodes = {operation: index for index, operation in enumerate(operations)}
+    operation_names = [strings.add(operation.value) for operation in operations]
+
+    quads = []
+    for quad in program.quad_list:
+        left = _encode_operand(quad.left_address, strings, opcodes)
+        right = _encode_operand(quad.right_address, strings, opcodes)
+        result = _encode_operand(quad.result_address, strings, opcodes)
+        quads.append(QUAD.pack(opcodes[quad.operation], left[0], right[0], result[0], left[1], right[1], result[1]))
+
+    constants = []
+    for address, value in program.constants.items():
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            constants.append(CONSTANT_INT.pack(int(address), INT_CONSTANT, value))
+        elif type(value) is int:
+            constants.append(CONSTANT_INT.pack(int(address), BIG_INT_CONSTANT, strings.add(str(value))))
+        elif type(value) is float:
+            constants.append(CONSTANT_FLOAT.pack(int(address), FLOAT_CONSTANT, value))
+        else:
+            constants.append(CONSTANT_INT.pack(int(address), STRING_CONSTANT, strings.add(value)))
+
+    functions = []
+    parameters = []
+    for id_, function_data in program.function_data.items():
+        sizes = []
+        for type_ in SIZE_TYPES:
+            size_unit = function_data.size_data.get_data(type_)
+            sizes += [size_unit.local, size_unit.temp]
+
+        type_index = VALUE_TYPES.index(function_data.type_) if isinstance(function_data.type_, ValueType) else -1
+        functions.append(FUNCTION.pack(strings.add(id_), function_data.start_quad, type_index,
+                                       len(function_data.parameter_signature), len(parameters), *sizes))
+        parameters += [VALUE_TYPES.index(type_) for type_ in function_data.parameter_signature]
+
+    lines = [quad.line or 0 for quad in program.quad_list]
+    source = strings.add(program.source) if program.source is not None else -1
+
+    pointer_fields = [POINTER_FIELD.pack(index, offset)
+                      for index, quad in enumerate(program.quad_list)
+                      for offset in quad.pointer_offsets]
+    element_types = [ELEMENT_TYPE.pack(index, VALUE_TYPES.index(quad.element_type))
+                     for index, quad in enumerate(program.quad_list) if quad.element_type is not None]
+
+    header = HEADER.pack(MAGIC, VERSION, program.heap_start, source, len(strings.strings), len(operations),
+                         len(quads), len(constants), len(functions), len(parameters), len(pointer_fields),
+                         len(element_types))
+    return b''.join([header, strings.encode(), struct.pack(f'<{len(operation_names)}I', *operation_names),
+                     *quads, *constants, *functions, bytes(parameters), struct.pack(f'<{len(lines)}I', *lines),
+                     *pointer_fields, *element_types])
+
+
+def decode_program(buffer) -> OutputFile:
+    """Reads a .tyc program from any buffer (bytes, mmap), only the final python values are built"""
+    with memoryview(buffer) as view:
+        magic, version, heap_start, source, string_count, operation_count, quad_count, constant_count, \
+            function_count, parameter_count, pointer_field_count, element_type_count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a compiled typeton program, or compiled by another version')
+        offset = HEADER.size
+
+        string_offsets = struct.unpack_from(f'<{string_count + 1}I', view, offset)
+        offset += OFFSET.size * (string_count + 1)
+        body = bytes(view[offset:offset + string_offsets[-1]])
+        strings = [body[string_offsets[i]:string_offsets[i + 1]].decode('utf-8') for i in range(string_count)]
+        offset += string_offsets[-1] + (-string_offsets[-1] % 4)
+
+        operations = [OperationType(strings[index])
+                      for index in struct.unpack_from(f'<{operation_count}I', view, offset)]
+        offset += OFFSET.size * operation_count
+
+        def operand(kind, value):
+            if kind == LITERAL:
+                return value
+            if kind == REFERENCE:
+                return PointerAction.REFERENCE, value
+            if kind == VALUE:
+                return PointerAction.VALUE, value
+            if kind == OPERATION:
+                return operations[value]
+            if kind == NAME:
+                return strings[value]
+            return None
+
+        end = offset + QUAD.size * quad_count
+        quad_list = [(operations[opcode], operand(left_kind, left), operand(right_kind, right),
+                      operand(result_kind, result))
+                     for opcode, left_kind, right_kind, result_kind, left, right, result
+                     in QUAD.iter_unpack(view[offset:end])]
+        offset = end
+
+        constants = {}
+        for _ in range(constant_count):
+            address, kind, value = CONSTANT_INT.unpack_from(view, offset)
+            if kind == FLOAT_CONSTANT:
+                _, _, value = CONSTANT_FLOAT.unpack_from(view, offset)
+            elif kind == STRING_CONSTANT:
+                value = strings[value]
+            elif kind == BIG_INT_CONSTANT:
+                value = int(strings[value])
+            constants[address] = value
+            offset += CONSTANT_INT.size
+
+        end = offset + FUNCTION.size * function_count
+        function_records = list(FUNCTION.iter_unpack(view[offset:end]))
+        parameter_types = [VALUE_TYPES[index] for index in view[end:end + parameter_count]]
+        lines = list(struct.unpack_from(f'<{quad_count}I', view, end + parameter_count))
+
+        offset = end + parameter_count + OFFSET.size * quad_count
+        end = offset + POINTER_FIELD.size * pointer_field_count
+        pointer_offsets = {}
+        for index, field_offset in POINTER_FIELD.iter_unpack(view[offset:end]):
+            pointer_offsets[index] = pointer_offsets.get(index, ()) + (field_offset,)
+
+        offset = end
+        end = offset + ELEMENT_TYPE.size * element_type_count
+        element_types = {index: VALUE_TYPES[type_index]
+                         for index, type_index in ELEMENT_TYPE.iter_unpack(view[offset:end])}
+        # slices past the end are only shorter, a missing tail would go unnoticed
+        if end > len(view):
+            raise ValueError('Truncated compiled program')
+
+    function_data = {}
+    for name, start_quad, type_index, count, first, *sizes in function_records:
+        data = FunctionData(strings[name], start_quad)
+        data.type_ = VALUE_TYPES[type_index] if type_index >= 0 else None
+        data.parameter_signature = parameter_types[first:first + count]
+        for index, type_ in enumerate(SIZE_TYPES):
+            size_unit = data.size_data.get_data(type_)
+            size_unit.local, size_unit.temp = sizes[2 * index], sizes[2 * index + 1]
+        function_data[data.id_] = data
+
+    return OutputFile(constants, function_data, quad_list, heap_start,
+                      strings[source] if source >= 0 else None, lines, pointer_offsets, element_types)
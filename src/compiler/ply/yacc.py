@@ -65,6 +65,8 @@ import re
 import types
 import sys
 import inspect
+import os
+import pickle
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -76,6 +78,7 @@ yaccdebug   = False            # Debugging mode.  If set, yacc generates a
                                # a 'compiler.out' file in the current symbol_table
 
 debug_file  = 'compiler.out'     # Default name of the debugging file
+tab_version = 1                # Version of the saved parse tables format
 error_count = 3                # Number of symbols that must be shifted to leave recovery mode
 resultlimit = 40               # Size limit of results when running in debug mode.
 
@@ -682,6 +685,34 @@ class Production(object):
         if self.func:
             self.callable = pdict[self.func]
 
+# -----------------------------------------------------------------------------
+# class MiniProduction
+#
+# The production kept by saved parse tables.  It only holds what the parser
+# needs to reduce a rule and call its function.
+# -----------------------------------------------------------------------------
+
+class MiniProduction(object):
+    def __init__(self, str, name, len, func, file, line):
+        self.name     = name
+        self.len      = len
+        self.func     = func
+        self.callable = None
+        self.file     = file
+        self.line     = line
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
 # -----------------------------------------------------------------------------
 # class LRItem
 #
@@ -2262,6 +2293,47 @@ class ParserReflect(object):
 
         self.grammar = grammar
 
+# -----------------------------------------------------------------------------
+#                             == Saved tables ==
+#
+# The action and goto tables of a LRTable are saved with the signature of the
+# grammar that produced them.  Reading them back skips the table generation,
+# tables of a grammar with another signature are never used.
+# -----------------------------------------------------------------------------
+
+class SavedLRTable:
+    def __init__(self, lr_action, lr_goto, lr_productions):
+        self.lr_action      = lr_action
+        self.lr_goto        = lr_goto
+        self.lr_productions = lr_productions
+
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+def write_tables(lr, signature, filename):
+    productions = [(p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line) for p in lr.lr_productions]
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first, so a parser never reads half of a table
+    temporary = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temporary, 'wb') as f:
+        pickle.dump((tab_version, signature, lr.lr_action, lr.lr_goto, productions), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, filename)
+
+def read_tables(filename, signature):
+    try:
+        with open(filename, 'rb') as f:
+            version, saved_signature, lr_action, lr_goto, productions = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+
+    if version != tab_version or saved_signature != signature:
+        return None
+    return SavedLRTable(lr_action, lr_goto, [MiniProduction(*p) for p in productions])
+
 # -----------------------------------------------------------------------------
 # yacc(module)
 #
@@ -2270,7 +2342,7 @@ class ParserReflect(object):
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, picklefile=None):
 
     # Reference to the parsing method of the last built compiler
     global parse
@@ -2303,6 +2375,18 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if pinfo.error:
         raise YaccError('Unable to build compiler')
 
+    # Rule names are part of the signature since the saved productions refer to them
+    signature = pinfo.signature() + ' '.join([f[2] for f in pinfo.pfuncs])
+
+    # Use saved tables of the same grammar when there are any, debugging always builds them
+    if picklefile and not debug:
+        lr = read_tables(picklefile, signature)
+        if lr is not None:
+            lr.bind_callables(pinfo.pdict)
+            parser = LRParser(lr, pinfo.error_func)
+            parse = parser.parse
+            return parser
+
     if debuglog is None:
         if debug:
             try:
@@ -2474,6 +2558,12 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
                 errorlog.warning('Rule (%s) is never reduced', rejected)
                 warned_never.append(rejected)
 
+    if picklefile:
+        try:
+            write_tables(lr, signature, picklefile)
+        except OSError as e:
+            errorlog.warning("Couldn't create %r. %s" % (picklefile, e))
+
     # Build the compiler
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
@@ -0,0 +1,102 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from src.utils.display import make_table, TableOptions
+
+
+class PhaseStats:
+    """Wall time and peak traced memory (bytes) of one compile phase"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.peak_memory: Optional[int] = None
+
+
+class CompileStats:
+    """Measurements of one compilation, every phase in the order it ran plus counters of what it produced"""
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseStats] = {}
+        self.tokens = 0
+        self.quads = 0
+        self.constants = 0
+        self.functions = 0
+        self.temporaries = 0
+        self.broadcasts = 0
+
+    def get_phase(self, name: str) -> PhaseStats:
+        if name not in self.phases:
+            self.phases[name] = PhaseStats(name)
+        return self.phases[name]
+
+    @contextmanager
+    def measure(self, name: str):
+        """Adds the time and peak memory of the block to the phase"""
+        phase = self.get_phase(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds += time.perf_counter() - start
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                phase.peak_memory = max(phase.peak_memory or 0, peak)
+
+    @property
+    def total_seconds(self):
+        return sum(phase.seconds for phase in self.phases.values())
+
+    def as_dict(self):
+        return {
+            'phases': {name: {'seconds': phase.seconds, 'peak_memory': phase.peak_memory}
+                       for name, phase in self.phases.items()},
+            'tokens': self.tokens,
+            'quads': self.quads,
+            'constants': self.constants,
+            'functions': self.functions,
+            'temporaries': self.temporaries,
+            'broadcasts': self.broadcasts,
+        }
+
+    def display(self):
+        def memory(phase):
+            return '-' if phase.peak_memory is None else f'{phase.peak_memory / 1024:.1f} KiB'
+
+        rows = [[name, f'{phase.seconds * 1000:.2f} ms', memory(phase)] for name, phase in self.phases.items()]
+        rows.append(['total', f'{self.total_seconds * 1000:.2f} ms', ''])
+        print(make_table('Compile Phases', ['PHASE', 'TIME', 'PEAK MEMORY'], rows, TableOptions(20, 20)))
+
+        counters = [['tokens', self.tokens], ['quads', self.quads], ['constants', self.constants],
+                    ['functions', self.functions], ['temporaries', self.temporaries],
+                    ['broadcasts', self.broadcasts]]
+        print(make_table('Compile Counters', ['NAME', 'COUNT'], counters, TableOptions(20, 20)))
+
+
+class TimedLexer:
+    """Wraps a lexer to count its tokens and add the time spent producing them to the lexing phase"""
+
+    def __init__(self, lexer, phase: PhaseStats, stats: CompileStats):
+        self._lexer = lexer
+        self._phase = phase
+        self._stats = stats
+
+    def input(self, data):
+        self._lexer.input(data)
+
+    def token(self):
+        start = time.perf_counter()
+        token = self._lexer.token()
+        self._phase.seconds += time.perf_counter() - start
+        if token is not None:
+            self._stats.tokens += 1
+        return token
+
+    def __getattr__(self, name):
+        return getattr(self._lexer, name)
@@ -73,6 +73,10 @@ class Class:
         self.current_variable.type_ = type_
         self.current_variable.class_id = class_id
 
+    def pointer_offsets(self):
+        """Offsets of the variables that hold other objects"""
+        return tuple(variable.offset for variable in self.variables.values() if variable.type_ is ValueType.POINTER)
+
     def display(self):
         print(make_table(self.id_ + ": Variables", ["ID", "TYPE", "OFFSET"],
                          map(lambda fun: [
@@ -2,8 +2,6 @@ from audioop import add
 from enum import Enum
 from typing import Dict
 
-import jsonpickle
-
 from src.compiler.errors import CompilerError, CompilerEvent
 from src.compiler.stack_allocator.helpers import Layers
 from src.compiler.stack_allocator.index import StackAllocator
@@ -238,7 +236,8 @@ class FunctionTable(Publisher, Subscriber):
         self.__validate_return()
 
         # tell quad generator to generate end_func quad
-        self.broadcast(Event(CompilerEvent.GEN_END_FUNC, None))
+        start = self.function_data_table[self.current_function.id_].start_quad
+        self.broadcast(Event(CompilerEvent.GEN_END_FUNC, start))
 
         delete_list = []
 
@@ -309,7 +308,4 @@ class FunctionTable(Publisher, Subscriber):
 
     def get_output_function_data(self):
         """ Returns function_data dictionary used in output file """
-        data = {}
-        for id_, function_data in self.function_data_table.items():
-            data[id_] = jsonpickle.encode(function_data)
-        return data
+        return dict(self.function_data_table)
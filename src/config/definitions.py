@@ -8,6 +8,12 @@ ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
 """ typeton/programs """
 PROGRAMS_DIR = os.path.join(ROOT_DIR, '../programs')
 
+""" typeton/.cache, compiled programs (can be moved with TYPETON_CACHE) """
+CACHE_DIR = os.environ.get('TYPETON_CACHE', os.path.join(ROOT_DIR, '../.cache'))
+
+""" Parse tables generated from the grammar, rebuilt when the grammar changes """
+PARSER_TABLES_FILE = os.path.join(CACHE_DIR, 'parsetab.pickle')
+
 """ typeton/tests/programs"""
 TEST_PROGRAMS_DIR = os.path.join(ROOT_DIR, 'tests/programs')
 
@@ -18,3 +24,10 @@ BOOL_RANGE_SIZE = 499
 STRING_RANGE_SIZE = 499
 POINTER_RANGE_SIZE = 499
 HEAP_RANGE_SIZE = 10000
+""" Cells each heap space can grow to, the heap starts with HEAP_RANGE_SIZE """
+HEAP_MAX_SIZE = 1 << 24
+
+""" typeton/benchmarks, benchmark results and the baseline they are compared against """
+BENCH_DIR = os.path.join(ROOT_DIR, '../benchmarks')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+MICRO_BASELINE_FILE = os.path.join(BENCH_DIR, 'micro_baseline.json')
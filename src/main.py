@@ -1,44 +1,137 @@
-from src.compiler import Compiler
 from src.virtual_machine import VirtualMachine
+from src.compiler.cache import CompileCache
+from src.virtual_machine.allocation_tracker import AllocationTracker
+from src.virtual_machine.compactor import HeapCompactor
+from src.virtual_machine.garbage_collector import GarbageCollector
+from src.virtual_machine.profiler import Profiler
+from src.virtual_machine.sampler import SamplingProfiler
+import mmap
 import os
 import sys
 from src.config.definitions import PROGRAMS_DIR
 
 DEFAULT_PROGRAM = 'sort.ty'
 
+
+def run_compiled(virtual_machine, filename, options, profile_files, sample_files):
+    """Already compiled programs are mapped straight into memory"""
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as program:
+        run(virtual_machine, program, options, profile_files, sample_files)
+
+
+def run(virtual_machine, program, options, profile_files, sample_files):
+    profiler = options.get('profiler')
+    sampler = options.get('sampler')
+    collector = options.get('collector')
+    compactor = options.get('compactor')
+    tracker = options.get('tracker')
+    try:
+        virtual_machine.run(program, **options)
+    finally:
+        # also reported when the program stops with a runtime error
+        if profiler is not None:
+            print()
+            print(profiler.report())
+            for profile_file in profile_files:
+                profiler.dump(profile_file)
+        if sampler is not None:
+            print()
+            print(sampler.report())
+            for sample_file in sample_files:
+                sampler.dump(sample_file)
+        if collector is not None:
+            print()
+            print(collector.report())
+        if compactor is not None:
+            print()
+            print(compactor.report())
+        if tracker is not None:
+            print()
+            print(tracker.report())
+
+
 def main():
-    # Check por program argument
+    # Check por program argument, flags start with a dash
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('-')]
+    programs = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+
     filename = os.path.join(PROGRAMS_DIR, DEFAULT_PROGRAM)
-    if (len(sys.argv)) > 1:
-        if sys.argv[1] != '-debug':
-            filename = os.path.join(PROGRAMS_DIR, sys.argv[1])
+    if programs:
+        filename = os.path.join(PROGRAMS_DIR, programs[0])
 
     # Open file with error handling
     try:
-        file = open(filename, 'r')
+        file = open(filename, 'rb' if filename.endswith('.tyc') else 'r')
     except OSError:
         print ("Could not find file at: ", filename)
         sys.exit()
 
+    virtual_machine = VirtualMachine()
+    options = {'compiled': '-aot' in flags, 'jit': '-nojit' not in flags}
+
+    # Check -profile and -profile-json=<file> flags
+    profile_files = [flag.split('=', 1)[1] for flag in flags if flag.startswith('-profile-json=')]
+    if '-profile' in flags or profile_files:
+        options['profiler'] = Profiler()
+
+    # Check -sample=<file> and -sample-interval=<ms> flags
+    sample_files = [flag.split('=', 1)[1] for flag in flags if flag.startswith('-sample=')]
+    intervals = [float(flag.split('=', 1)[1]) / 1000 for flag in flags if flag.startswith('-sample-interval=')]
+    if sample_files or intervals:
+        if SamplingProfiler.supported():
+            options['sampler'] = SamplingProfiler(*intervals[:1])
+        else:
+            print('Sampling is not available on this platform, running without it')
+
+    # Check -gc and -gc-threshold=<cells> flags
+    thresholds = [int(flag.split('=', 1)[1]) for flag in flags if flag.startswith('-gc-threshold=')]
+    if '-gc' in flags or thresholds:
+        options['collector'] = GarbageCollector(*thresholds[:1])
+
+    # Check -compact and -compact-threshold=<fragmentation> flags
+    fragmentations = [float(flag.split('=', 1)[1]) for flag in flags if flag.startswith('-compact-threshold=')]
+    if '-compact' in flags or fragmentations:
+        options['compactor'] = HeapCompactor(*fragmentations[:1])
+
+    # Check -heap-report flag
+    if '-heap-report' in flags:
+        options['tracker'] = AllocationTracker()
+
+    if filename.endswith('.tyc'):
+        file.close()
+        run_compiled(virtual_machine, filename, options, profile_files, sample_files)
+        return
 
     data = file.read()
     file.close()
 
-    # Run Compiler
-    compiler = Compiler()
-    
     # Check -debug flag
-    is_debug = False
-    if (len(sys.argv) == 2):
-        is_debug = sys.argv[1] == '-debug'
-    elif (len(sys.argv) > 2):
-        is_debug = sys.argv[2] == '-debug'
+    is_debug = '-debug' in flags
+
+    # Check --compile-stats flag
+    show_stats = '--compile-stats' in flags
 
-    json_data = compiler.compile(data, debug=is_debug)
+    # Programs compiled before are reused, debug and stats runs always compile to display the tables
+    cache = CompileCache()
+    use_cache = not is_debug and not show_stats and '-nocache' not in flags
+    cached = cache.lookup(data, os.path.basename(filename)) if use_cache else None
+    if cached is not None:
+        run(virtual_machine, cached, options, profile_files, sample_files)
+        return
+
+    # Run Compiler, imported here since cached programs don't need it
+    from src.compiler import Compiler
+    compiler = Compiler(debug=is_debug)
+    program = compiler.compile(data, debug=is_debug, stats=show_stats, filename=os.path.basename(filename))
+
+    if show_stats:
+        compiler.stats.display()
+
+    if use_cache:
+        cache.store(data, program, os.path.basename(filename))
 
     # Run Virtual Machine
-    virtual_machine = VirtualMachine()
-    virtual_machine.run(json_data)
+    run(virtual_machine, program, options, profile_files, sample_files)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,54 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from ..bench import macro, micro, scaling
+from ..bench.generator import ProgramShape, generate_program
+from ..bench.macro import printed_result
+from ..bench.workloads import WORKLOADS
+from ..compiler import Compiler
+from ..virtual_machine import VirtualMachine
+
+
+class TestMacroBenchmarks(unittest.TestCase):
+    def test_workloads(self):
+        # every workload checks the result it printed
+        results = macro.run_suite([(name, workload.sizes[0]) for name, workload in WORKLOADS.items()],
+                                  repeat=1, isolate=False)
+        self.assertEqual(len(results), len(WORKLOADS))
+        self.assertTrue(all(result['operations'] > 0 for result in results.values()))
+
+    def test_compare(self):
+        baseline = {'sort/10': {'run_seconds': 1.0, 'operations': 100}}
+        self.assertEqual(macro.compare({'sort/10': {'run_seconds': 1.05, 'operations': 100}}, baseline, 0.1), [])
+
+        regressions = macro.compare({'sort/10': {'run_seconds': 1.5, 'operations': 100}}, baseline, 0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('sort/10 run_seconds'))
+
+
+class TestMicroBenchmarks(unittest.TestCase):
+    def test_operations(self):
+        results = micro.run_benchmarks(list(micro.BENCHMARKS), repetitions=20, repeat=1)
+        self.assertEqual(set(results), set(micro.BENCHMARKS))
+        self.assertEqual(results['call']['operations'], 80)
+
+
+class TestScalingBenchmark(unittest.TestCase):
+    def test_generated_program(self):
+        source = generate_program(ProgramShape(functions=3, globals_=2).scaled(2))
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            VirtualMachine().run(program)
+        self.assertIsNotNone(printed_result(output.getvalue()))
+
+    def test_growth(self):
+        self.assertAlmostEqual(scaling.exponent(1, 4, 10, 20), 2)
+        self.assertEqual(scaling.superlinear({'parser': 1.0, 'events': 2.0}, 1.2), ['events'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from ..compiler import Compiler
+from ..compiler.cache import CompileCache
+from ..compiler.output import MAGIC, decode_program
+from ..compiler.ply import yacc
+
+
+SOURCE = 'func main() -> {\n    print(1)\n}\n'
+
+
+def compile_source(source):
+    with redirect_stdout(io.StringIO()):
+        return Compiler().compile(source)
+
+
+class TestCompileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CompileCache(self.directory.name, max_entries=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lookup(self):
+        self.assertIsNone(self.cache.lookup(SOURCE))
+
+        program = compile_source(SOURCE)
+        self.cache.store(SOURCE, program)
+        self.assertEqual(self.cache.lookup(SOURCE).quad_list, decode_program(program).quad_list)
+        self.assertIsNone(self.cache.lookup('func main() -> {}'))
+
+    def test_invalid_entry(self):
+        path = self.cache.store('func main() -> {}', b'')
+        self.assertIsNone(self.cache.lookup('func main() -> {}'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_truncated_entry(self):
+        program = compile_source(SOURCE)
+        path = self.cache.store(SOURCE, program[:len(program) // 2])
+        self.assertIsNone(self.cache.lookup(SOURCE))
+        self.assertFalse(os.path.exists(path))
+
+    def test_prune(self):
+        for index in range(4):
+            self.cache.store(f'func main() -> {{ print({index}) }}', MAGIC)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+
+class TestParserTables(unittest.TestCase):
+    def test_saved_tables(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'parsetab.pickle')
+            compiler = Compiler()
+            built = yacc.yacc(module=compiler, start='program', picklefile=filename)
+
+            saved = yacc.read_tables(filename, 'another grammar')
+            self.assertIsNone(saved)
+
+            loaded = yacc.yacc(module=compiler, start='program', picklefile=filename)
+            self.assertEqual(loaded.action, built.action)
+            self.assertEqual(loaded.goto, built.goto)
+            self.assertEqual([p.callable for p in loaded.productions], [p.callable for p in built.productions])
+
+
+if __name__ == '__main__':
+    unittest.main()
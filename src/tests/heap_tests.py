@@ -0,0 +1,145 @@
+import unittest
+
+from ..compiler.stack_allocator.types import ValueType
+from ..virtual_machine.compactor import HeapCompactor
+from ..virtual_machine.heap_memory import Heap, RuntimeActions
+
+
+class TestHeap(unittest.TestCase):
+    def setUp(self):
+        self.heap = Heap(100)
+        self.errors = []
+        self.heap.add_subscriber(self, {RuntimeActions.STOP_RUNTIME})
+
+    def handle_event(self, event):
+        self.errors.append(event.payload)
+
+    def test_coalescing(self):
+        first, second, third = [self.heap.allocate_reference(10) for _ in range(3)]
+        self.heap.free_reference(first)
+        self.heap.free_reference(third)
+        self.assertEqual(self.heap.stats()['free_blocks'], 2)
+
+        # freeing the middle block merges everything back into a single range
+        self.heap.free_reference(second)
+        self.assertEqual([(range_.start, range_.end) for range_ in self.heap.free_ranges],
+                         [(100, 100 + self.heap.size - 1)])
+        self.assertEqual(self.heap.stats()['used'], 0)
+
+    def test_exact_fit(self):
+        blocks = [self.heap.allocate_reference(5) for _ in range(3)]
+        self.heap.free_reference(blocks[1])
+
+        # reuses the hole, and the block can be released again
+        self.assertEqual(self.heap.allocate_reference(5), blocks[1])
+        self.heap.release_heap_memory(blocks[1])
+        self.assertEqual(self.heap.stats()['live_blocks'], 2)
+
+    def test_fit_inside_size_class(self):
+        self.heap = Heap(100, max_size=self.heap.size)
+        self.heap.add_subscriber(self, {RuntimeActions.STOP_RUNTIME})
+        blocks = [self.heap.allocate_reference(size) for size in [100, 1, self.heap.size - 101]]
+        self.heap.free_reference(blocks[0])
+
+        # 100 cells are in the same size class as 80, the only place where 80 cells fit
+        self.assertEqual(self.heap.allocate_reference(80), blocks[0])
+        self.assertIsNone(self.heap.allocate_reference(30))
+        self.assertEqual(self.errors, ['Not enough heap memory to allocate reference'])
+
+    def test_pointer_fields(self):
+        parent = self.heap.allocate_reference(3, (0,))
+        child = self.heap.allocate_reference(2, (1,))
+        numbers = self.heap.allocate_reference(2)
+        self.heap.set_value(parent, child)
+        self.heap.set_value(child + 1, parent)
+        # values that look like addresses, inside a block without pointer fields
+        self.heap.set_value(numbers, parent)
+        self.heap.set_value(numbers + 1, child)
+
+        # the cycle is released once, the numbers are never followed
+        self.heap.release_heap_memory(parent)
+        self.assertEqual(list(self.heap.blocks), [numbers])
+        self.assertEqual(self.heap.get_value(numbers + 1), child)
+        self.assertEqual(self.errors, [])
+
+    def test_grow_and_shrink(self):
+        size = self.heap.size
+        blocks = [self.heap.allocate_reference(size // 2) for _ in range(3)]
+        self.assertEqual(self.heap.size, 2 * size)
+        self.heap.set_value(blocks[2] + size // 2 - 1, 'last')
+        self.assertEqual(self.heap.get_value(blocks[2] + size // 2 - 1), 'last')
+
+        for block in reversed(blocks):
+            self.heap.free_reference(block)
+        self.assertEqual(self.heap.size, size)
+        self.assertEqual(self.errors, [])
+
+    def test_typed_arrays(self):
+        numbers = self.heap.allocate_reference(3, element_type=ValueType.INT)
+        ratios = self.heap.allocate_reference(3, element_type=ValueType.FLOAT)
+        self.heap.set_value(numbers + 1, 2 ** 40)
+        self.heap.set_value(ratios, 0.5)
+        self.assertEqual(self.heap.get_value(numbers + 1), 2 ** 40)
+        self.assertEqual(self.heap.get_value(ratios), 0.5)
+
+        # cells never assigned, or released, are uninitialized
+        self.assertIsNone(self.heap.get_value(numbers))
+        self.heap.release_heap_memory(numbers)
+        self.assertIsNone(self.heap.get_value(numbers + 1))
+        self.assertEqual(len(self.errors), 2)
+
+    def test_big_int_elements(self):
+        numbers = self.heap.allocate_reference(2, element_type=ValueType.INT)
+        self.heap.set_value(numbers, 7)
+        self.heap.set_value(numbers + 1, 2 ** 70)
+        self.assertEqual(self.heap.get_value(numbers), 7)
+        self.assertEqual(self.heap.get_value(numbers + 1), 2 ** 70)
+
+        # released cells of the widened space are still uninitialized
+        self.heap.release_heap_memory(numbers)
+        numbers = self.heap.allocate_reference(2, element_type=ValueType.INT)
+        self.assertIsNone(self.heap.get_value(numbers + 1))
+        self.assertEqual(len(self.errors), 1)
+
+    def test_compaction(self):
+        holes = [self.heap.allocate_reference(10) for _ in range(3)]
+        parent = self.heap.allocate_reference(2, (0,))
+        child = self.heap.allocate_reference(2)
+        self.heap.set_value(parent, child)
+        self.heap.set_value(child + 1, 'child')
+        for hole in holes:
+            self.heap.free_reference(hole)
+
+        # a frame with a pointer to the parent, and one to the second cell of the child
+        frame = [parent, child + 1, 'name']
+        self.assertEqual(HeapCompactor().compact(self.heap, [(frame, slice(0, 2))]), 30)
+
+        self.assertEqual(frame, [100, 103, 'name'])
+        self.assertEqual(self.heap.get_value(self.heap.get_value(frame[0]) + 1), 'child')
+        self.assertEqual(self.heap.get_value(frame[1]), 'child')
+        self.assertEqual(self.heap.pointer_fields, {100: (0,)})
+        self.assertEqual(self.heap.stats()['free_blocks'], 1)
+
+    def test_fragmentation(self):
+        blocks = [self.heap.allocate_reference(10) for _ in range(self.heap.size // 10)]
+        for block in blocks[::2]:
+            self.heap.free_reference(block)
+
+        stats = self.heap.stats()
+        self.assertEqual(stats['free'], self.heap.size // 2)
+        self.assertEqual(stats['largest_free_block'], 10)
+        self.assertGreater(stats['fragmentation'], 0.99)
+
+    def test_fresh_heap_fragmentation(self):
+        self.assertEqual(self.heap.stats()['fragmentation'], 0.0)
+
+        # every space is a single free block, even though no block holds all the free cells
+        numbers = self.heap.allocate_reference(10, element_type=ValueType.INT)
+        self.heap.free_reference(numbers)
+        stats = self.heap.stats()
+        self.assertLess(stats['largest_free_block'], stats['free'])
+        self.assertEqual(stats['fragmentation'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+from ..compiler import Compiler
+from ..virtual_machine import VirtualMachine
+from ..config.definitions import PROGRAMS_DIR
+
+
+class TestCompileStats(unittest.TestCase):
+    def test_compile_stats(self):
+        with open(os.path.join(PROGRAMS_DIR, 'sort.ty')) as file:
+            data = file.read()
+
+        compiler = Compiler()
+        with redirect_stdout(io.StringIO()):
+            compiler.compile(data, stats=True)
+        stats = compiler.stats
+
+        self.assertEqual(list(stats.phases), ['parser construction', 'lexing', 'parsing', 'serialization'])
+        self.assertIsNotNone(stats.phases['parsing'].peak_memory)
+        self.assertGreater(stats.tokens, 0)
+        self.assertEqual(stats.functions, 4)
+        self.assertEqual(stats.quads, len(compiler._code_generator.get_output_quads()))
+        self.assertGreater(stats.broadcasts, 0)
+
+        # running a program in between broadcasts too, only the compiler's own broadcasts are counted
+        with redirect_stdout(io.StringIO()):
+            VirtualMachine().run(Compiler().compile(data))
+            again = Compiler()
+            again.compile(data, stats=True)
+        self.assertEqual(again.stats.broadcasts, stats.broadcasts)
+
+    def test_no_stats(self):
+        compiler = Compiler()
+        with redirect_stdout(io.StringIO()):
+            compiler.compile('func main() -> {\n    print(1)\n}')
+        self.assertIsNone(compiler.stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
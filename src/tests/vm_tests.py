@@ -0,0 +1,235 @@
+import io
+import mmap
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from ..compiler import Compiler
+from ..compiler.code_generator.type import OperationType
+from ..virtual_machine import VirtualMachine
+from ..virtual_machine.allocation_tracker import AllocationTracker
+from ..virtual_machine.garbage_collector import GarbageCollector
+from ..virtual_machine.jit import JIT_THRESHOLD
+from ..virtual_machine.profiler import Profiler
+from ..virtual_machine.sampler import SamplingProfiler
+from ..config.definitions import PROGRAMS_DIR
+
+
+def compile_program(filename):
+    file = open(os.path.join(PROGRAMS_DIR, filename))
+    data = file.read()
+    file.close()
+
+    with redirect_stdout(io.StringIO()):
+        return Compiler().compile(data, filename=filename)
+
+
+def execute(program, **options):
+    """Runs a compiled program, returns the lines it printed"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        VirtualMachine().run(program, **options)
+
+    lines = output.getvalue().splitlines()
+    start = lines.index('--- Start execution -------------------------')
+    end = lines.index('Main function ended')
+    return [line for line in lines[start + 1:end] if line != '']
+
+
+def run_program(filename, **options):
+    """Compiles and runs a program inside the programs folder, returns printed lines"""
+    return execute(compile_program(filename), **options)
+
+
+class TestVirtualMachine(unittest.TestCase):
+    def test_sort(self):
+        lines = run_program('sort.ty')
+        self.assertEqual(lines[0], 'Unsorted array')
+        self.assertEqual(lines[1:11], ['3', '4', '10', '8', '2', '6', '9', '1', '5', '7'])
+        self.assertEqual(lines[11], 'Sorted array')
+        self.assertEqual(lines[12:22], [str(i) for i in range(1, 11)])
+
+    def test_multmat(self):
+        self.assertEqual(run_program('multmat.ty'), ['58', '64', '139', '154'])
+
+    def test_fibo(self):
+        self.assertEqual(run_program('fibo.ty'), [
+            'iterative fibo (with temp var)',
+            'recursive factorial', '3628800',
+            'iterative factorial', '3628800',
+            'recursive fibo', '6765',
+            'dynamic p array fibo', '6765',
+            'faster iterative fibo', '6765',
+            'true', 'false'
+        ])
+
+    def test_objects(self):
+        self.assertEqual(run_program('objects.ty'),
+                         ['500', '1000', '5000', '500', '1000', 'Still dad', 'Son', 'Son'])
+
+    def test_heap(self):
+        lines = run_program('heap.ty')
+        self.assertEqual(lines[0], 'paco')
+        self.assertEqual(lines[6], "paco's parent's parent's parent's parent's parent's parent")
+        self.assertEqual(lines[7:], [str(2 * i) for i in range(100)])
+
+    def test_arrays(self):
+        lines = run_program('arrays.ty')
+        self.assertEqual(lines, ['25'] * 400 + ['100'])
+
+    def test_compiled(self):
+        for filename in ['sort.ty', 'multmat.ty', 'fibo.ty', 'objects.ty', 'heap.ty', 'arrays.ty']:
+            self.assertEqual(run_program(filename, compiled=True), run_program(filename), filename)
+
+    def test_mapped_program(self):
+        program = compile_program('multmat.ty')
+        with tempfile.TemporaryFile() as file:
+            file.write(program)
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.assertEqual(execute(mapped), ['58', '64', '139', '154'])
+
+    def test_profiler(self):
+        profiler = Profiler()
+        self.assertEqual(run_program('fibo.ty', profiler=profiler), run_program('fibo.ty'))
+        self.assertEqual(profiler.functions['factorial_r'].calls, 11)
+        self.assertEqual(profiler.functions['main'].calls, 1)
+
+        gosubs = profiler.operations[OperationType.GOSUB].count
+        self.assertEqual(gosubs, sum(profile.calls for id_, profile in profiler.functions.items() if id_ != 'main'))
+
+    def test_error_location(self):
+        source = 'func main() -> {\n    var a: Int\n    a = 0\n    print(1 / a)\n}\n'
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source, filename='zero.ty')
+
+        output = io.StringIO()
+        with redirect_stdout(output), self.assertRaises(SystemExit):
+            VirtualMachine().run(program, jit=False)
+        self.assertIn('Division by zero (zero.ty:4)', output.getvalue())
+
+    def test_profiler_lines(self):
+        profiler = Profiler()
+        run_program('fibo.ty', profiler=profiler)
+        self.assertEqual(profiler.functions['fib_r'].location, 'fibo.ty:5')
+        self.assertGreater(profiler.lines['fibo.ty:8'].count, 0)
+
+    def test_local_blocks_released(self):
+        # the array never leaves the function, so it is released when the function ends
+        source = ('func fill(n: Int) -> Int {\n    var arr: Int[100]\n    arr[0] = n\n    return arr[0]\n}\n\n'
+                  'func main() -> {\n    var i: Int\n    var total: Int\n    total = 0\n    i = 0\n'
+                  '    while (i < 200) {\n        total = total + fill(i)\n        i += 1\n    }\n    print(total)\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+
+        collector = GarbageCollector()
+        self.assertEqual(execute(program, collector=collector), [str(sum(range(200)))])
+        self.assertEqual(collector.collections, 0)
+
+        for options in [{'jit': False}, {}, {'compiled': True}]:
+            tracker = AllocationTracker()
+            self.assertEqual(execute(program, tracker=tracker, **options), [str(sum(range(200)))])
+            self.assertEqual(tracker.live_sites(), [])
+
+    def test_allocation_tracker(self):
+        # every cell allocated in the loop is still allocated when main ends, 99 of them unreachable
+        source = ('class Cell {\n    value: Int\n}\n\n'
+                  'func main() -> {\n    var cell: Cell\n    var i: Int\n    i = 0\n'
+                  '    while (i < 100) {\n        cell = new Cell()\n        i += 1\n    }\n    print(i)\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source, filename='leak.ty')
+
+        for options in [{'jit': False}, {'compiled': True}]:
+            tracker = AllocationTracker()
+            self.assertEqual(execute(program, tracker=tracker, **options), ['100'])
+            [(site, blocks, cells)] = tracker.live_sites()
+            self.assertEqual((blocks, cells), (100, 100))
+            self.assertIn('leak.ty:10', tracker.report())
+
+    @unittest.skipUnless(SamplingProfiler.supported(), 'needs interval timer signals')
+    def test_sampler(self):
+        sampler = SamplingProfiler(interval=0.0005)
+        self.assertEqual(run_program('fibo.ty', sampler=sampler), run_program('fibo.ty'))
+        self.assertGreater(sampler.sample_count, 0)
+        self.assertTrue(all(stack[0] == 'main' for stack in sampler.samples))
+        self.assertTrue(all(line.startswith('main') for line in sampler.collapsed()))
+
+    def test_garbage_collector(self):
+        # every call leaks 100 objects of one cell, 200 calls fill the initial heap twice
+        source = ('class Cell {\n    value: Int\n}\n\n'
+                  'func leak(n: Int) -> Int {\n    var cell: Cell\n    var i: Int\n    i = 0\n'
+                  '    while (i < 100) {\n        cell = new Cell()\n        i += 1\n    }\n'
+                  '    cell.value = n\n    return cell.value\n}\n\n'
+                  'func main() -> {\n    var i: Int\n    var total: Int\n    total = 0\n    i = 0\n'
+                  '    while (i < 200) {\n        total = total + leak(i)\n        i += 1\n    }\n    print(total)\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+
+        collector = GarbageCollector()
+        self.assertEqual(execute(program, collector=collector), [str(sum(range(200)))])
+        self.assertGreater(collector.collections, 0)
+
+        # objects reachable from main survive collections after every few allocations
+        collector = GarbageCollector(threshold=10)
+        self.assertEqual(run_program('heap.ty', collector=collector), run_program('heap.ty'))
+        self.assertGreater(collector.collections, 0)
+
+    def test_interpreted(self):
+        for filename in ['sort.ty', 'multmat.ty', 'fibo.ty', 'objects.ty', 'heap.ty', 'arrays.ty']:
+            self.assertEqual(run_program(filename, jit=False), run_program(filename), filename)
+
+    def test_big_int_literal(self):
+        # literals past 64 bits are kept as text in the compiled program
+        source = 'func main() -> {\n    var x: Int\n    x = 99999999999999999999\n    print(x + 1)\n}\n'
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+
+        for options in [{'jit': False}, {'compiled': True}]:
+            self.assertEqual(execute(program, **options), [str(99999999999999999999 + 1)])
+
+    def test_big_int_array_element(self):
+        # Int array elements past 64 bits move the Int space to a list
+        source = ('func fact(n: Int) -> Int {\n    if (n <= 1) {\n        return 1\n    }\n'
+                  '    return n * fact(n - 1)\n}\n\n'
+                  'func main() -> {\n    var values: Int[2]\n    values[0] = 7\n    values[1] = fact(25)\n'
+                  '    print(values[0] + values[1])\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+
+        for options in [{'jit': False}, {'compiled': True}]:
+            self.assertEqual(execute(program, **options), [str(7 + 15511210043330985984000000)])
+
+    def test_hotness_kinds(self):
+        # the loop header is also the first quad of the function, calls and loop runs are counted apart
+        source = ('func spin(n: Int) -> {\n    while (n > 0) {\n        n -= 1\n    }\n}\n\n'
+                  'func main() -> {\n    spin(3)\n    spin(3)\n    print(1)\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+            virtual_machine = VirtualMachine()
+            virtual_machine.run(program)
+
+        start = virtual_machine.get_function_start('spin')
+        self.assertEqual(virtual_machine._hotness[(OperationType.GOSUB, start)], 2)
+        self.assertEqual(virtual_machine._hotness[(OperationType.GOTO, start)], 6)
+
+
+    def test_hot_regions_compiled(self):
+        source = ('func twice(n: Int) -> Int {\n    return n * 2\n}\n\n'
+                  'func main() -> {\n    var i: Int\n    var total: Int\n    i = 0\n    total = 0\n'
+                  '    while (i < 200) {\n        total += twice(i)\n        i += 1\n    }\n    print(total)\n}\n')
+        with redirect_stdout(io.StringIO()):
+            program = Compiler().compile(source)
+            virtual_machine = VirtualMachine()
+            virtual_machine.run(program)
+
+        start = virtual_machine.get_function_start('twice')
+        self.assertEqual(virtual_machine._hotness[(OperationType.GOSUB, start)], JIT_THRESHOLD)
+        regions = [ip for ip, handler in enumerate(virtual_machine._handlers)
+                   if handler.__qualname__.endswith('__region_handler.<locals>.execute')]
+        self.assertIn(start, regions)
+        self.assertTrue(any(ip < start or ip >= virtual_machine._function_ranges['twice'][1] for ip in regions))
+        self.assertEqual(execute(program), execute(program, jit=False))
+
+if __name__ == '__main__':
+    unittest.main()
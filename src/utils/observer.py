@@ -20,6 +20,9 @@ class Subscriber:
 class Publisher:
     """Class that wants to publish messages to subscribers implements this"""
 
+    # broadcasts of this publisher, the compile stats add up the ones of the compiler
+    broadcast_count = 0
+
     def __init__(self):
         self.__subscribers: List[(Subscriber, Dict)] = []
 
@@ -29,6 +32,7 @@ class Publisher:
 
     def broadcast(self, event):
         """Push message to all subscribers"""
+        self.broadcast_count += 1
         for subscriber, events in self.__subscribers:
             if event.type_ in events or len(events) == 0:
                 subscriber.handle_event(event)
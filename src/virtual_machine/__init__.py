@@ -1 +1,6 @@
-from .virtual_machine import VirtualMachine
+def __getattr__(name):
+    # Loaded on first use, so the compiler output module can import the runtime types without a cycle
+    if name == 'VirtualMachine':
+        from .virtual_machine import VirtualMachine
+        return VirtualMachine
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,53 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.utils.display import make_table, TableOptions
+from src.virtual_machine.heap_memory import Heap
+
+
+class AllocationTracker:
+    """
+    Remembers the quad that allocated every heap block, so the blocks still alive when the program
+    ends can be grouped by the line that allocated them, the usual sign of a leak.
+
+    The heap records the sites while it is attached, interpreted and compiled quads both pass theirs.
+    """
+
+    def __init__(self):
+        self.heap: Optional[Heap] = None
+        self._locate: Callable[[int], Optional[str]] = lambda ip: None
+
+    def attach(self, heap: Heap, locate: Callable[[int], Optional[str]] = None):
+        """`locate` returns the 'file:line' of a quad"""
+        self.heap = heap
+        heap.sites = {}
+        if locate is not None:
+            self._locate = locate
+
+    def live_sites(self) -> List[Tuple[Optional[int], int, int]]:
+        """(site, live blocks, live cells) of every site with blocks still allocated, most cells first"""
+        sites: Dict[Optional[int], List[int]] = {}
+        for start, site in self.heap.sites.items():
+            totals = sites.setdefault(site, [0, 0])
+            totals[0] += 1
+            totals[1] += self.heap.blocks[start]
+        return sorted(((site, blocks, cells) for site, (blocks, cells) in sites.items()),
+                      key=lambda row: row[2], reverse=True)
+
+    def __location(self, site: Optional[int]) -> str:
+        location = self._locate(site) if site is not None else None
+        return location or '<unknown>'
+
+    def report(self, max_sites=20) -> str:
+        site_rows = [[self.__location(site), '' if site is None else str(site), f'{blocks:,}', f'{cells:,}']
+                     for site, blocks, cells in self.live_sites()[:max_sites]]
+
+        stats = self.heap.stats()
+        heap_rows = [[f'{stats["size"]:,}', f'{stats["used"]:,}', f'{stats["peak_used"]:,}',
+                      f'{stats["free_blocks"]:,}', f'{stats["largest_free_block"]:,}',
+                      f'{stats["fragmentation"]:.1%}']]
+
+        return '\n'.join([
+            make_table('Live Heap Blocks', ['LOCATION', 'QUAD', 'BLOCKS', 'CELLS'], site_rows, TableOptions(16, 20)),
+            make_table('Heap', ['SIZE', 'USED', 'PEAK USED', 'FREE BLOCKS', 'LARGEST FREE', 'FRAGMENTATION'],
+                       heap_rows, TableOptions(16, 20)),
+        ])
@@ -0,0 +1,115 @@
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+from src.utils.display import make_table, TableOptions
+from src.virtual_machine.heap_memory import Heap, HeapSpace
+
+# (list, slice) of the slots that may hold heap addresses
+PointerSlots = Iterable[Tuple[List, slice]]
+
+
+class HeapCompactor:
+    """
+    Sliding compactor: moves the live blocks of a heap space to its start, in address order, so all its
+    free cells end up in one block after the last one.
+
+    Every pointer to a moved block is rewritten: the pointer fields of heap blocks and the pointer slots
+    the Virtual Machine hands over (frames and return values in flight). Slots may point inside a block,
+    those keep their offset from the start of the block.
+
+    The heap asks for a compaction when an allocation doesn't fit a space that has enough free cells,
+    it runs when the fragmentation of the space is at least `threshold`. `compact` can also be called
+    at any point where every pointer is in those slots.
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self.compactions = 0
+        self.moved_blocks = 0
+        self.moved_cells = 0
+        self.reclaimed_cells = 0
+        self.seconds = 0.0
+
+    def should_compact(self, space: HeapSpace) -> bool:
+        return space.fragmentation() >= self.threshold
+
+    def compact(self, heap: Heap, slots: PointerSlots, spaces: List[HeapSpace] = None) -> int:
+        """Compacts the given spaces (every space by default), returns the cells joined to the free space at the end"""
+        start_time = time.perf_counter()
+        old_sizes = dict(heap.blocks)
+
+        forwarding = {}
+        reclaimed = 0
+        for space in spaces or [space for space in heap.spaces if space is not None]:
+            reclaimed += self.__slide(heap, space, forwarding)
+
+        if forwarding:
+            self.__rewrite(heap, forwarding, old_sizes, slots)
+
+        self.compactions += 1
+        self.moved_blocks += len(forwarding)
+        self.moved_cells += sum(old_sizes[start] for start in forwarding)
+        self.reclaimed_cells += reclaimed
+        self.seconds += time.perf_counter() - start_time
+        return reclaimed
+
+    @staticmethod
+    def __slide(heap: Heap, space: HeapSpace, forwarding: Dict[int, int]) -> int:
+        """Moves every block of the space down to the first free cell, records old start -> new start"""
+        memory, initialized = space.memory, space.initialized
+        end = space.start + space.max_size
+        cursor = space.start
+        for start in sorted(start for start in heap.blocks if space.start <= start < end):
+            size = heap.blocks[start]
+            if start != cursor:
+                old, new = start - space.start, cursor - space.start
+                memory[new:new + size] = memory[old:old + size]
+                if initialized is not None:
+                    initialized[new:new + size] = initialized[old:old + size]
+                forwarding[start] = cursor
+            cursor += size
+
+        reclaimed = space.top - cursor
+        space.reset_free_space(cursor)
+        return reclaimed
+
+    @staticmethod
+    def __rewrite(heap: Heap, forwarding: Dict[int, int], old_sizes: Dict[int, int], slots: PointerSlots):
+        blocks = {forwarding.get(start, start): size for start, size in heap.blocks.items()}
+        heap.blocks.clear()
+        heap.blocks.update(blocks)
+        pointer_fields = {forwarding.get(start, start): fields for start, fields in heap.pointer_fields.items()}
+        heap.pointer_fields.clear()
+        heap.pointer_fields.update(pointer_fields)
+        if heap.sites is not None:
+            sites = {forwarding.get(start, start): site for start, site in heap.sites.items()}
+            heap.sites.clear()
+            heap.sites.update(sites)
+
+        # heap fields always hold the start of a block
+        memory = heap.memory
+        for start, fields in pointer_fields.items():
+            offset = start - heap.start
+            for field in fields:
+                value = memory[offset + field]
+                if value in forwarding:
+                    memory[offset + field] = forwarding[value]
+
+        moved = sorted(forwarding)
+        for storage, pointer_slots in slots:
+            for index in range(*pointer_slots.indices(len(storage))):
+                value = storage[index]
+                if type(value) is not int or value < heap.start:
+                    continue
+                position = bisect_right(moved, value) - 1
+                if position >= 0:
+                    start = moved[position]
+                    if value < start + old_sizes[start]:
+                        storage[index] = forwarding[start] + value - start
+
+    def report(self) -> str:
+        rows = [[f'{self.compactions:,}', f'{self.moved_blocks:,}', f'{self.moved_cells:,}',
+                 f'{self.reclaimed_cells:,}', f'{self.seconds * 1000:.2f}']]
+        return make_table('Heap Compactor', ['COMPACTIONS', 'BLOCKS MOVED', 'CELLS MOVED', 'CELLS JOINED', 'MS'],
+                          rows, TableOptions(14, 20))
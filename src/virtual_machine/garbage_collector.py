@@ -0,0 +1,84 @@
+import math
+import time
+from bisect import bisect_right
+from typing import Iterable
+
+from src.utils.display import make_table, TableOptions
+from src.virtual_machine.heap_memory import Heap
+
+
+class GarbageCollector:
+    """
+    Mark and sweep collector for the heap.
+
+    Roots are the values of every pointer slot the Virtual Machine holds: the global frame, the call
+    stack, the frames of calls being set up and the return values in flight. Pointer temporaries may
+    point inside a block (an array element or an object field), so any address inside a block keeps
+    all of it alive. Inside the heap only the pointer fields of each block are followed.
+
+    It runs when an allocation doesn't fit and, with a `threshold`, every time that many more cells
+    are in use than after the last collection.
+    """
+
+    def __init__(self, threshold: int = None):
+        self.threshold = threshold
+        self.collections = 0
+        self.reclaimed_blocks = 0
+        self.reclaimed_cells = 0
+        self.seconds = 0.0
+
+    def attach(self, heap: Heap):
+        heap.collect_at = heap.used + self.threshold if self.threshold else math.inf
+
+    def collect(self, heap: Heap, roots: Iterable) -> int:
+        """Releases every block no root reaches, returns the cells reclaimed"""
+        start_time = time.perf_counter()
+        marked = self.__mark(heap, roots)
+
+        blocks = [(start, size) for start, size in heap.blocks.items() if start not in marked]
+        for start, _ in blocks:
+            heap.discard(start)
+
+        cells = sum(size for _, size in blocks)
+        self.collections += 1
+        self.reclaimed_blocks += len(blocks)
+        self.reclaimed_cells += cells
+        self.seconds += time.perf_counter() - start_time
+        self.attach(heap)
+        return cells
+
+    @staticmethod
+    def __mark(heap: Heap, roots: Iterable) -> set:
+        """Start of every block reachable from the roots"""
+        starts = sorted(heap.blocks)
+        blocks = heap.blocks
+        pointer_fields = heap.pointer_fields
+        memory = heap.memory
+        heap_start = heap.start
+
+        pending = []
+        for value in roots:
+            if type(value) is int and value >= heap_start:
+                index = bisect_right(starts, value) - 1
+                if index >= 0 and value < starts[index] + blocks[starts[index]]:
+                    pending.append(starts[index])
+
+        marked = set()
+        while pending:
+            start = pending.pop()
+            if start in marked or start not in blocks:
+                continue
+
+            marked.add(start)
+            offset = start - heap_start
+            for field in pointer_fields.get(start, ()):
+                value = memory[offset + field]
+                if value is not None:
+                    pending.append(value)
+        return marked
+
+    def report(self) -> str:
+        rows = [[f'{self.collections:,}', f'{self.reclaimed_blocks:,}', f'{self.reclaimed_cells:,}',
+                 f'{self.seconds * 1000:.2f}']]
+        return make_table('Garbage Collector', ['COLLECTIONS', 'BLOCKS FREED', 'CELLS FREED', 'MS'], rows,
+                          TableOptions(14, 20))
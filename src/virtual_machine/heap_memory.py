@@ -1,12 +1,17 @@
+import math
+from array import array
 from enum import Enum
-from functools import cmp_to_key
+from typing import Dict, List, Optional, Tuple
 
-from src.config.definitions import HEAP_RANGE_SIZE
+from src.compiler.stack_allocator.types import ValueType
+from src.config.definitions import HEAP_MAX_SIZE, HEAP_RANGE_SIZE
 from src.utils.observer import Event, Publisher
 
 
 class RuntimeActions(Enum):
     STOP_RUNTIME = 'stop_runtime'
+    COLLECT_GARBAGE = 'collect_garbage'
+    COMPACT_HEAP = 'compact_heap'
 
 
 class FreeRange:
@@ -23,116 +28,447 @@ class FreeRange:
     def __str__(self):
         return f'({self.start}, {self.end})'
 
-    def __lt__(self, other):
-        return self.size > other.size
 
+# Free blocks smaller than this have one list per size, bigger ones one list per power of two
+SMALL_SIZES = 64
+SMALL_BITS = SMALL_SIZES.bit_length() - 1
 
-def compare(a, b):
-    return a.start - b.start or a.end - b.end
+
+def size_class(size: int) -> int:
+    """Index of the free list that keeps blocks of `size`"""
+    if size < SMALL_SIZES:
+        return size
+    return SMALL_SIZES + size.bit_length() - 1 - SMALL_BITS
+
+
+def fitting_class(size: int) -> int:
+    """Index of the first free list where every block has at least `size` cells"""
+    if size < SMALL_SIZES or size & (size - 1) == 0:
+        return size_class(size)
+    return size_class(size) + 1
+
+
+class FreeLists:
+    """
+    Segregated free lists: free blocks are indexed by start, by end and by size class.
+
+    Indexing both ends merges a freed block with its free neighbours in O(1), and the bitmap of
+    non empty classes finds the smallest list where every block fits the request in O(1).
+    """
+
+    def __init__(self):
+        self.by_start: Dict[int, int] = {}  # start -> size
+        self.by_end: Dict[int, int] = {}  # end -> start
+        self.classes: List[Dict[int, int]] = []  # start -> size, per size class
+        self.non_empty = 0  # bit n is set while class n has blocks
+
+    def add(self, start: int, size: int):
+        self.by_start[start] = size
+        self.by_end[start + size - 1] = start
+
+        index = size_class(size)
+        while len(self.classes) <= index:
+            self.classes.append({})
+        self.classes[index][start] = size
+        self.non_empty |= 1 << index
+
+    def remove(self, start: int) -> int:
+        size = self.by_start.pop(start)
+        del self.by_end[start + size - 1]
+
+        index = size_class(size)
+        free_class = self.classes[index]
+        del free_class[start]
+        if not free_class:
+            self.non_empty &= ~(1 << index)
+        return size
+
+    def find(self, size: int):
+        """Start of a free block of at least `size`, None if there is none"""
+        index = fitting_class(size)
+        candidates = self.non_empty >> index
+        if candidates:
+            index += (candidates & -candidates).bit_length() - 1
+            return next(iter(self.classes[index]))
+
+        # blocks in the power of two class of size may still be big enough
+        index = size_class(size)
+        if size >= SMALL_SIZES and index < len(self.classes):
+            for start, block_size in self.classes[index].items():
+                if block_size >= size:
+                    return start
+        return None
+
+    def __len__(self):
+        return len(self.by_start)
+
+
+# Int and Float arrays live in their own space, as machine values instead of Python objects
+TYPECODES = {ValueType.INT: 'q', ValueType.FLOAT: 'd'}
+# where each space starts, in multiples of the maximum size of a space
+SPACE_WINDOWS = {None: 0, ValueType.INT: 1, ValueType.FLOAT: 2}
+
+
+class HeapSpace:
+    """
+    A range of heap addresses with its own storage, that grows and shrinks at its end.
+
+    The object space keeps any value in a list, where None marks an uninitialized cell. Typed spaces
+    keep their values in an `array` and mark the initialized cells in a byte map, free cells are zero.
+    A typed space widened to a list, once a value doesn't fit its array, keeps its byte map.
+    """
+
+    def __init__(self, start, size, max_size, typecode=None):
+        self.start = start
+        self.size = size
+        self.min_size = size
+        self.max_size = max_size
+        self.typecode = typecode
+        self.memory = self.__empty(size)
+        self.initialized = None if typecode is None else bytearray(size)
+
+        # holes between allocated blocks, the free space after the last block starts at top
+        self.free_lists = FreeLists()
+        self.top = start
+        self.used = 0
+
+    @property
+    def end(self):
+        return self.start + self.size - 1
+
+    def take_block(self, size) -> Optional[int]:
+        free_lists = self.free_lists
+        reference = free_lists.find(size) if free_lists.non_empty else None
+
+        if reference is not None:
+            free_size = free_lists.remove(reference)
+            if free_size > size:
+                free_lists.add(reference + size, free_size - size)
+        elif self.top + size <= self.start + self.size:
+            reference = self.top
+            self.top += size
+        else:
+            return None
+
+        self.used += size
+        return reference
+
+    def give_back(self, reference, size):
+        """Returns the block to the free lists, merged with the free blocks right before and after it"""
+        self.used -= size
+        free_lists = self.free_lists
+        start, end = reference, reference + size - 1
+        if end + 1 in free_lists.by_start:
+            end += free_lists.remove(end + 1)
+        previous = free_lists.by_end.get(start - 1)
+        if previous is not None:
+            free_lists.remove(previous)
+            start = previous
+
+        if end + 1 != self.top:
+            free_lists.add(start, end - start + 1)
+            return
+
+        self.top = start
+        self.trim()
+
+    def trim(self):
+        """Halves the space while the free space after the last block is three quarters of it"""
+        while self.size > self.min_size and self.top - self.start <= self.size // 4:
+            self.resize(max(self.min_size, self.size // 2))
+
+    def reset_free_space(self, top):
+        """Every cell from `top` on is free, used after moving all the blocks before it"""
+        self.clear(top, self.top - top)
+        self.free_lists = FreeLists()
+        self.top = top
+        self.trim()
+
+    def fragmentation(self) -> float:
+        free = self.size - self.used
+        largest = max((range_.size for range_ in self.free_ranges), default=0)
+        return 1 - largest / free if free else 0.0
+
+    def grow(self, size) -> bool:
+        """Doubles the space, or more if `size` cells still don't fit after the last block"""
+        needed = self.top - self.start + size
+        if needed > self.max_size:
+            return False
+        self.resize(min(self.max_size, max(self.size * 2, needed)))
+        return True
+
+    def __empty(self, size):
+        if self.typecode is None:
+            return [None] * size
+        return array(self.typecode, bytes(size * 8))
+
+    def widen(self):
+        """Keeps the values of a typed space in a list from now on"""
+        self.memory = list(self.memory)
+        self.typecode = None
+
+    def resize(self, size):
+        """Storage after the last block is added or dropped, blocks never move"""
+        if size > self.size:
+            self.memory.extend(self.__empty(size - self.size))
+            if self.initialized is not None:
+                self.initialized.extend(bytes(size - self.size))
+        else:
+            del self.memory[size:]
+            if self.initialized is not None:
+                del self.initialized[size:]
+        self.size = size
+
+    def clear(self, reference, size):
+        offset = reference - self.start
+        self.memory[offset:offset + size] = self.__empty(size)
+        if self.initialized is not None:
+            self.initialized[offset:offset + size] = bytes(size)
+
+    @property
+    def free_ranges(self) -> List[FreeRange]:
+        ranges = [FreeRange(start, start + size - 1) for start, size in sorted(self.free_lists.by_start.items())]
+        if self.top <= self.end:
+            ranges.append(FreeRange(self.top, self.end))
+        return ranges
 
 
 class Heap(Publisher):
-    def __init__(self, range_start):
+    """
+    Every object and array of a running program. Objects, and arrays of other types, are in the object
+    space, Int and Float arrays in typed spaces created on their first allocation. Each space can grow up
+    to `max_size` cells, and the address of every block says which space it belongs to.
+    """
+
+    def __init__(self, range_start, size=HEAP_RANGE_SIZE, max_size=HEAP_MAX_SIZE):
         super().__init__()
-        self.size = HEAP_RANGE_SIZE
         self.start = range_start
-        self.ranges = [FreeRange(range_start, range_start + self.size - 1)]
-        self.end_map = {}
-        self.end = range_start + self.size - 1
-        self.memory = [None] * self.size
+        self.max_size = max(size, max_size)
+        self.objects = HeapSpace(range_start, size, self.max_size)
+        self.memory = self.objects.memory
+        # space of each window of addresses, None until it is used
+        self.spaces: List[Optional[HeapSpace]] = [self.objects, None, None]
+        # storage of the Int and Float spaces, empty until they are created
+        self.int_start = range_start + SPACE_WINDOWS[ValueType.INT] * self.max_size
+        self.float_start = range_start + SPACE_WINDOWS[ValueType.FLOAT] * self.max_size
+        self.int_values, self.int_initialized = array('q'), bytearray()
+        self.float_values, self.float_initialized = array('d'), bytearray()
+
+        # start -> size of every allocated block
+        self.blocks: Dict[int, int] = {}
+        # start -> offsets of the cells that hold pointers, only for blocks that have any
+        self.pointer_fields: Dict[int, Tuple[int, ...]] = {}
+
+        self.used = 0
+        self.peak_used = 0
+        self.allocations = 0
+        self.releases = 0
+        # once used reaches it allocating asks for a collection, set by the garbage collector
+        self.collect_at = math.inf
+        # start -> quad that allocated each block, only while an allocation tracker is attached
+        self.sites: Optional[Dict[int, int]] = None
+
+    @property
+    def size(self):
+        return sum(space.size for space in self.spaces if space is not None)
 
     def get_value(self, heap_address):
-        value = self.memory[heap_address - self.start]
+        if heap_address < self.int_start:
+            value = self.memory[heap_address - self.start]
 
-        # print('Heap', heap_address, 'value', value)
+            # print('Heap', heap_address, 'value', value)
 
-        if value is None:
-            self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'NULL Pointer Exception: Trying to get value from uninitialized address'))
+            if value is None:
+                self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'NULL Pointer Exception: Trying to get value from uninitialized address'))
 
-        return value
+            return value
+
+        # free cells of typed spaces are zero, so only zeros need to look at the initialized map
+        if heap_address < self.float_start:
+            index = heap_address - self.int_start
+            value = self.int_values[index]
+            if value or self.int_initialized[index]:
+                return value
+        else:
+            index = heap_address - self.float_start
+            value = self.float_values[index]
+            if value or self.float_initialized[index]:
+                return value
+
+        self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'NULL Pointer Exception: Trying to get value from uninitialized address'))
 
     def set_value(self, heap_address, value):
-        if len(self.memory) <= heap_address - self.start:
+        if heap_address < self.int_start:
+            if len(self.memory) <= heap_address - self.start:
+                self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Value does not exist'))
+            self.memory[heap_address - self.start] = value
+            return
+
+        if heap_address < self.float_start:
+            index, values, initialized = heap_address - self.int_start, self.int_values, self.int_initialized
+        else:
+            index, values, initialized = heap_address - self.float_start, self.float_values, self.float_initialized
+        try:
+            values[index] = value
+        except IndexError:
             self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Value does not exist'))
-        self.memory[heap_address - self.start] = value
+            return
+        except (TypeError, OverflowError):
+            if values is not self.int_values or type(value) is not int:
+                self.broadcast(Event(RuntimeActions.STOP_RUNTIME, f'{value!r} does not fit in a 64 bit array element'))
+                return
+            # Int values are unbounded, past 64 bits the Int space keeps them in a list
+            space = self.spaces[SPACE_WINDOWS[ValueType.INT]]
+            space.widen()
+            self.int_values = space.memory
+            self.int_values[index] = value
+        initialized[index] = 1
+
+    def space_of(self, heap_address) -> Optional[HeapSpace]:
+        window = (heap_address - self.start) // self.max_size
+        return self.spaces[window] if 0 <= window < len(self.spaces) else None
 
     def is_heap_address(self, address):
-        return self.start <= address <= self.end
+        return self.space_of(address) is not None
 
-    def release_heap_memory(self, heap_address, level=0):
+    def release_heap_memory(self, heap_address):
+        """Releases the block at the given address and every block its pointer fields reach"""
         if heap_address is None:
             self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'NULL Pointer Exception: Trying to free uninitialized address'))
 
-        """Release the heap memory at the given address"""
-        end = self.end_map[heap_address] - self.start
-        start = heap_address - self.start
-
-        curr = start
-        while (curr <= end):
-            value = self.memory[curr]
-            if type(value) is int and self.is_heap_address(value):
-                # print('found object at level', level)
-                self.release_heap_memory(value, level+1)
-            elif value is not None:
-                # print('freeing', value)
-                self.memory[curr] = None
-            curr += 1
-
-        self.free_reference(heap_address)
-
-    def allocate_reference(self, size):
-        """Take the biggest range possible, break it up if needed"""
-        if len(self.ranges) == 0:
-            self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Out of heap memory'))
-            return
-        largest_free_block = self.ranges[0].size
-        if size > largest_free_block:
-            self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Not enough heap memory to allocate reference'))
+        memory = self.memory
+        pending = [heap_address]
+        while pending:
+            reference = pending.pop()
+            if reference not in self.blocks:
+                # released before, through another reference
+                continue
+
+            offset = reference - self.start
+            for field in self.pointer_fields.get(reference, ()):
+                value = memory[offset + field]
+                if value is not None:
+                    pending.append(value)
+            self.discard(reference)
+
+    def discard(self, reference):
+        """Clears the cells of the block and frees it"""
+        size = self.blocks.get(reference)
+        if size is not None:
+            self.space_of(reference).clear(reference, size)
+            self.free_reference(reference)
+
+    def allocate_reference(self, size, pointer_offsets: Tuple[int, ...] = (), element_type: ValueType = None,
+                           site: int = None):
+        """
+        Takes a hole of the smallest size class that fits, the rest of it stays free. `pointer_offsets` are
+        the cells of the block that hold pointers, the rest are values and are never followed.
+        Int and Float arrays (`element_type`) are taken from their typed space. `site` is the quad allocating.
+        When nothing fits, subscribers are asked to collect garbage, then to compact the space if it has
+        enough free cells, and the space grows if it is still more than half full. Reaching the
+        collection threshold also asks for a collection
+        """
+        if size < 1:
+            size = 1
+        if self.used >= self.collect_at:
+            self.broadcast(Event(RuntimeActions.COLLECT_GARBAGE, size))
+
+        space = self.objects if element_type is None else self.__typed_space(element_type)
+        reference = space.take_block(size)
+        if reference is None:
+            self.broadcast(Event(RuntimeActions.COLLECT_GARBAGE, size))
+            reference = space.take_block(size)
+            if reference is None and space.size - space.used >= size:
+                # enough free cells, but not next to each other
+                self.broadcast(Event(RuntimeActions.COMPACT_HEAP, space))
+                reference = space.take_block(size)
+            # growing now, instead of collecting again after a few allocations
+            if (reference is None or space.used * 2 > space.size) and space.grow(size) and reference is None:
+                reference = space.take_block(size)
+
+        if reference is None:
+            if space.size == space.max_size and space.used == space.size:
+                self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Out of heap memory'))
+            else:
+                self.broadcast(Event(RuntimeActions.STOP_RUNTIME, 'Not enough heap memory to allocate reference'))
             return
 
-        free_block = self.ranges.pop()
-        if size == largest_free_block:
-            return free_block.start
+        self.blocks[reference] = size
+        if pointer_offsets:
+            self.pointer_fields[reference] = pointer_offsets
+        if self.sites is not None:
+            self.sites[reference] = site
+        self.used += size
+        if self.used > self.peak_used:
+            self.peak_used = self.used
+        self.allocations += 1
+        return reference
 
-        reference = free_block.start
-        new_start = free_block.start + size
-        free_block.start = new_start
+    def __typed_space(self, element_type: ValueType) -> HeapSpace:
+        window = SPACE_WINDOWS.get(element_type)
+        if window is None:
+            return self.objects
+
+        space = self.spaces[window]
+        if space is None:
+            space = HeapSpace(self.start + window * self.max_size, self.objects.min_size, self.max_size,
+                              TYPECODES[element_type])
+            self.spaces[window] = space
+            if element_type is ValueType.INT:
+                self.int_values, self.int_initialized = space.memory, space.initialized
+            else:
+                self.float_values, self.float_initialized = space.memory, space.initialized
+        return space
 
-        self.ranges.append(free_block)
-        self.end_map[reference] = new_start - 1
-        # maintain references for instant access and range optimization
-        return reference
+    def free_reference(self, reference):
+        """Returns the block to the free lists of its space"""
+        size = self.blocks.pop(reference, None)
+        if size is None:
+            return
+        self.pointer_fields.pop(reference, None)
+        if self.sites is not None:
+            self.sites.pop(reference, None)
+        self.used -= size
+        self.releases += 1
+        self.space_of(reference).give_back(reference, size)
+
+    @property
+    def free_ranges(self) -> List[FreeRange]:
+        return [range_ for space in self.spaces if space is not None for range_ in space.free_ranges]
+
+    def stats(self):
+        """
+        Usage and external fragmentation: the share of free memory outside the largest free block of its space,
+        a block is never taken from the holes of another space
+        """
+        spaces = [space for space in self.spaces if space is not None]
+        size = self.size
+        free = size - self.used
+        ranges = self.free_ranges
+        largest = max((range_.size for range_ in ranges), default=0)
+        fragmented = sum(space.fragmentation() * (space.size - space.used) for space in spaces)
+        return {
+            'size': size,
+            'used': self.used,
+            'peak_used': self.peak_used,
+            'free': free,
+            'free_blocks': len(ranges),
+            'largest_free_block': largest,
+            'fragmentation': fragmented / free if free else 0.0,
+            'live_blocks': len(self.blocks),
+            'allocations': self.allocations,
+            'releases': self.releases,
+        }
 
     def display(self):
         print('----------------------------------------')
-        for range_ in self.ranges:
+        for range_ in self.free_ranges:
             print(range_)
 
-        if len(self.ranges) == 0:
+        if self.used == self.size:
             print("no spaces left")
 
+        stats = self.stats()
+        print(f'used {stats["used"]} of {stats["size"]}, peak {stats["peak_used"]}, '
+              f'{stats["free_blocks"]} free blocks, fragmentation {stats["fragmentation"]:.1%}')
         print('----------------------------------------')
-
-    def _merge_intervals(self):
-        """To prevent fragmentation, always merge continuous intervals if possible"""
-        self.ranges.sort(key=cmp_to_key(compare))
-
-        result = []
-
-        last = None
-        for range_ in self.ranges:
-            if not last or range_.start > last.end + 1:
-                last = range_
-                result.append(last)
-            elif range_.end > last.end:
-                last.end = range_.end
-
-        self.ranges = result
-
-    def free_reference(self, reference):
-        # print('freeing reference', reference)
-        """Adds range to be able to use it again"""
-
-        end = self.end_map[reference]
-        self.ranges.append(FreeRange(reference, end))
-        self._merge_intervals()
@@ -0,0 +1,124 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.compiler.code_generator.type import OperationType
+from src.compiler.stack_allocator.helpers import Layers
+from src.virtual_machine.memory_layout import AddressResolver
+from src.virtual_machine.transpiler import JUMPS, Transpiler, UnsupportedOperation, runtime_namespace
+from src.virtual_machine.types import Instruction
+
+# How many times a loop header or a function entry runs in the interpreter before it gets compiled
+JIT_THRESHOLD = 50
+
+# Quads that touch the frame stack, a region hands them back to the interpreter
+EXITS = {
+    OperationType.ARE,
+    OperationType.PARAM,
+    OperationType.GOSUB,
+    OperationType.RETURN,
+    OperationType.ENDFUNC,
+    OperationType.END_GLOBAL,
+}
+
+Region = Callable[[List, int], Tuple[int, int]]
+
+
+class RegionCompiler(Transpiler):
+    """
+    Compiles a hot range of quads inside one function into a Python closure.
+
+    The closure runs on the storage list of the current frame, so the interpreter and the
+    compiled code share every value and either one can continue where the other stopped.
+    It is entered at any of its block leaders and returns (next quad, executed quads) once it
+    reaches a quad it can't run, like a call or a return, or jumps out of its range.
+    """
+
+    def __init__(self, quads: List[Instruction], function_data, resolvers: Dict[str, AddressResolver],
+                 constants: List, global_storage: List, object_heap, pending_return: List,
+                 stop: Callable[[str], None]):
+        super().__init__(quads, function_data, resolvers, constants)
+        self._namespace = runtime_namespace(global_storage, object_heap, stop)
+        self._namespace['pending_return'] = pending_return
+
+    def compile_region(self, id_, start, end) -> Tuple[Optional[Region], List[int]]:
+        """Returns the closure of quads [start, end) and the quads it can be entered at"""
+        resolver = self._resolvers[id_]
+
+        translations = {}
+        leaders = {start}
+        for index in range(start, end):
+            quad = self._quads[index]
+            if quad.operation in JUMPS:
+                leaders.add(quad.result)
+                leaders.add(index + 1)
+            else:
+                translations[index] = self.__translate(quad, resolver, index)
+                if translations[index] is None:
+                    leaders.add(index + 1)
+
+        # a block that starts on an exit has nothing to run
+        leaders = sorted(leader for leader in leaders
+                         if start <= leader < end and translations.get(leader, ()) is not None)
+        if not leaders:
+            return None, []
+
+        lines = ['def region(s, block):', '    n = 0', '    while True:']
+        for index, leader in enumerate(leaders):
+            keyword = 'if' if index == 0 else 'elif'
+            lines.append(f'        {keyword} block == {leader}:')
+            lines.extend('            ' + line for line in self.__block(leader, end, set(leaders), translations, resolver))
+
+        namespace = dict(self._namespace)
+        exec(compile('\n'.join(lines) + '\n', f'<region {id_}:{start}>', 'exec'), namespace)
+        return namespace['region'], leaders
+
+    def __translate(self, quad: Instruction, resolver: AddressResolver, index: int) -> Optional[List[str]]:
+        if quad.operation in EXITS:
+            return None
+        if quad.operation is OperationType.CALL_ASSIGN:
+            return [self._write(quad.result, 'pending_return.pop()', resolver)]
+
+        try:
+            return self._quad(quad, resolver, index)
+        except UnsupportedOperation:
+            return None
+
+    def __block(self, leader, end, leaders, translations, resolver) -> List[str]:
+        def goto(target):
+            return f'block = {target}' if target in leaders else f'return {target}, n'
+
+        lines = []
+        count = 0
+        index = leader
+        while True:
+            if index >= end or (index in leaders and index != leader):
+                lines.append(goto(index))
+                break
+
+            quad = self._quads[index]
+            if quad.operation is OperationType.GOTO:
+                count += 1
+                lines.append(goto(quad.result))
+                break
+            if quad.operation is OperationType.GOTOF or quad.operation is OperationType.GOTOV:
+                count += 1
+                condition = 'False' if quad.operation is OperationType.GOTOF else 'True'
+                lines.append(f'if {self._read(quad.left, resolver)} is {condition}:')
+                lines.append(f'    {goto(quad.result)}')
+                lines.append('else:')
+                lines.append(f'    {goto(index + 1)}')
+                break
+            if translations[index] is None:
+                lines.append(f'return {index}, n')
+                break
+
+            lines.extend(translations[index])
+            count += 1
+            index += 1
+
+        return [f'n += {count}'] + lines
+
+    def _storage(self, address, resolver: AddressResolver):
+        layer, _, index = resolver.resolve(address)
+        if layer is Layers.LOCAL or layer is Layers.TEMPORARY:
+            return f's[{index}]'
+        return super()._storage(address, resolver)
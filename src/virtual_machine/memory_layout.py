@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Tuple
+
+from src.compiler.stack_allocator.helpers import Layers, init_types
+from src.compiler.stack_allocator.types import ValueType, DEFAULT_TYPES, MemoryType
+
+
+class MemoryLayout:
+    """Immutable map of the virtual address space, built once from the same segments the compiler uses"""
+
+    def __init__(self, memory_types: List[MemoryType] = DEFAULT_TYPES):
+        segments = init_types(memory_types, is_runtime=True)
+
+        blocks = []
+        for segment in segments.values():
+            for resource in segment.resources.values():
+                blocks.append((segment.type_, resource.type_, resource.start, resource.end))
+        blocks.sort(key=lambda block: block[2])
+
+        # every address points to the index of the (layer, type) block that contains it
+        self.end = blocks[-1][3]
+        block_index = bytearray(self.end + 1)
+        for index, (_, _, start, end) in enumerate(blocks):
+            block_index[start:end + 1] = bytes([index]) * (end - start + 1)
+
+        self.blocks: Tuple[Tuple[Layers, ValueType, int, int], ...] = tuple(blocks)
+        self.block_index = bytes(block_index)
+        self.types: Tuple[ValueType, ...] = tuple(memory_type.type for memory_type in memory_types)
+
+        constant_segment = segments[Layers.CONSTANT.value]
+        self.constant_start = constant_segment.start
+        self.constant_size = constant_segment.end - constant_segment.start + 1
+
+
+DEFAULT_LAYOUT = MemoryLayout()
+
+
+class AddressResolver:
+    """
+    Maps every address a function uses to one index of a flat storage list in O(1).
+
+    A frame stores, for each type, its locals followed by its temporaries. Constants are
+    indexed inside the shared constant pool, which follows the same layout for every function.
+    """
+
+    def __init__(self, function_data, layout: MemoryLayout = DEFAULT_LAYOUT):
+        size_data = function_data.size_data
+
+        # where the slots of each type start inside the frame
+        type_start = {}
+        frame_size = 0
+        for type_ in layout.types:
+            type_start[type_] = frame_size
+            frame_size += size_data.get_data(type_).total
+
+        self.block_index = layout.block_index
+        self.blocks = []
+        for layer, type_, start, _ in layout.blocks:
+            if layer is Layers.CONSTANT:
+                base = -layout.constant_start
+            else:
+                base = type_start[type_] - start
+                if layer is Layers.TEMPORARY:
+                    base += size_data.get_data(type_).local
+            self.blocks.append((layer, type_, base))
+
+        # parameters are the first locals of their type, in signature order
+        self.parameter_indexes = []
+        type_count = {}
+        for type_ in function_data.parameter_signature:
+            count = type_count.get(type_, 0)
+            self.parameter_indexes.append(type_start[type_] + count)
+            type_count[type_] = count + 1
+
+        # every pointer slot of a frame, the roots of the garbage collector
+        self.pointer_slots = slice(type_start[ValueType.POINTER],
+                                   type_start[ValueType.POINTER] + size_data.get_data(ValueType.POINTER).total)
+        self.frame_size = frame_size
+        self.blank_frame = (None,) * frame_size
+
+    def resolve(self, address):
+        """Returns (layer, type, index) for the given address"""
+        layer, type_, base = self.blocks[self.block_index[address]]
+        return layer, type_, address + base
+
+    def get_type(self, address) -> ValueType:
+        return self.blocks[self.block_index[address]][1]
+
+
+def build_constant_pool(constants: Dict[int, Any], layout: MemoryLayout = DEFAULT_LAYOUT) -> List:
+    """Stores constant values in a flat list indexed the same way AddressResolver indexes them"""
+    pool = [None] * layout.constant_size
+    for address, value in constants.items():
+        pool[int(address) - layout.constant_start] = value
+    return pool
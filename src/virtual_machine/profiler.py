@@ -0,0 +1,171 @@
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.compiler.code_generator.type import OperationType
+from src.utils.display import make_table, TableOptions
+from src.virtual_machine.types import Instruction
+
+
+class OperationProfile:
+    def __init__(self, operation: OperationType):
+        self.operation = operation
+        self.count = 0
+        self.seconds = 0.0
+
+
+class LineProfile:
+    def __init__(self, location: str):
+        self.location = location
+        self.count = 0
+        self.seconds = 0.0
+
+
+class FunctionProfile:
+    """Inclusive time counts nested calls, exclusive time only the quads of the function itself"""
+
+    def __init__(self, id_: str):
+        self.id_ = id_
+        self.location: Optional[str] = None
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class Profiler:
+    """
+    Counts executions and time of every operation and function of a run.
+
+    The Virtual Machine only consults it while binding handlers: each handler is wrapped once,
+    so a run without a profiler executes exactly the same code as before.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.operations: Dict[OperationType, OperationProfile] = {}
+        self.functions: Dict[str, FunctionProfile] = {}
+        self.lines: Dict[str, LineProfile] = {}
+
+        # [id, start time, time the function last resumed]
+        self._call_stack: List[list] = []
+        self._active: Dict[str, int] = {}
+
+    def wrap(self, operation: OperationType, handler: Callable[[Instruction], None], location: str = None):
+        """Measures a quad handler, `location` is the 'file:line' the quad was generated from"""
+        profile = self.operations.get(operation)
+        if profile is None:
+            profile = self.operations[operation] = OperationProfile(operation)
+        line = self.__line(location)
+        clock = self._clock
+
+        def profiled(quad):
+            start = clock()
+            handler(quad)
+            elapsed = clock() - start
+            profile.seconds += elapsed
+            profile.count += 1
+            line.seconds += elapsed
+            line.count += 1
+
+        if operation is OperationType.GOSUB:
+            def profiled_call(quad):
+                profiled(quad)
+                self.enter(quad.result)
+            return profiled_call
+
+        if operation is OperationType.ENDFUNC:
+            def profiled_end(quad):
+                profiled(quad)
+                self.leave()
+            return profiled_end
+
+        return profiled
+
+    def __line(self, location) -> LineProfile:
+        location = location or '<unknown>'
+        line = self.lines.get(location)
+        if line is None:
+            line = self.lines[location] = LineProfile(location)
+        return line
+
+    def __function(self, id_) -> FunctionProfile:
+        profile = self.functions.get(id_)
+        if profile is None:
+            profile = self.functions[id_] = FunctionProfile(id_)
+        return profile
+
+    def locate_function(self, id_: str, location: Optional[str]):
+        self.__function(id_).location = location
+
+    def enter(self, id_: str):
+        now = self._clock()
+        if self._call_stack:
+            caller = self._call_stack[-1]
+            self.functions[caller[0]].exclusive += now - caller[2]
+
+        profile = self.__function(id_)
+        profile.calls += 1
+
+        self._active[id_] = self._active.get(id_, 0) + 1
+        self._call_stack.append([id_, now, now])
+
+    def leave(self):
+        if not self._call_stack:
+            return
+
+        now = self._clock()
+        id_, start, resumed = self._call_stack.pop()
+        profile = self.functions[id_]
+        profile.exclusive += now - resumed
+
+        # recursive calls are already inside the inclusive time of the outermost one
+        self._active[id_] -= 1
+        if self._active[id_] == 0:
+            profile.inclusive += now - start
+
+        if self._call_stack:
+            self._call_stack[-1][2] = now
+
+    def finish(self):
+        """Closes the functions still running, when the program stopped with an error"""
+        while self._call_stack:
+            self.leave()
+
+    def as_dict(self):
+        return {
+            'operations': {profile.operation.name: {'count': profile.count, 'seconds': profile.seconds}
+                           for profile in self.operations.values() if profile.count},
+            'functions': {profile.id_: {'location': profile.location, 'calls': profile.calls,
+                                        'inclusive': profile.inclusive, 'exclusive': profile.exclusive}
+                          for profile in self.functions.values() if profile.calls},
+            'lines': {line.location: {'count': line.count, 'seconds': line.seconds}
+                      for line in self.lines.values() if line.count},
+        }
+
+    def dump(self, filename: str):
+        with open(filename, 'w') as file:
+            json.dump(self.as_dict(), file, indent=2)
+
+    def report(self, max_lines=20) -> str:
+        operations = sorted((profile for profile in self.operations.values() if profile.count),
+                            key=lambda profile: profile.seconds, reverse=True)
+        operation_rows = [[profile.operation.name, f'{profile.count:,}', f'{profile.seconds * 1000:.3f}',
+                           f'{profile.seconds / profile.count * 1e9:.0f}'] for profile in operations]
+
+        functions = sorted((profile for profile in self.functions.values() if profile.calls),
+                           key=lambda profile: profile.exclusive, reverse=True)
+        function_rows = [[profile.id_, profile.location or '', f'{profile.calls:,}',
+                          f'{profile.inclusive * 1000:.3f}', f'{profile.exclusive * 1000:.3f}']
+                         for profile in functions]
+
+        lines = sorted((line for line in self.lines.values() if line.count),
+                       key=lambda line: line.seconds, reverse=True)[:max_lines]
+        line_rows = [[line.location, f'{line.count:,}', f'{line.seconds * 1000:.3f}'] for line in lines]
+
+        return '\n'.join([
+            make_table('Operations', ['OPERATION', 'COUNT', 'TOTAL MS', 'NS PER OP'], operation_rows,
+                       TableOptions(16, 20)),
+            make_table('Functions', ['FUNCTION', 'LOCATION', 'CALLS', 'INCLUSIVE MS', 'EXCLUSIVE MS'],
+                       function_rows, TableOptions(16, 20)),
+            make_table('Lines', ['LOCATION', 'COUNT', 'TOTAL MS'], line_rows, TableOptions(16, 20)),
+        ])
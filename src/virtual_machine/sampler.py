@@ -0,0 +1,76 @@
+import signal
+from typing import Dict, List, Tuple
+
+from src.utils.display import make_table, TableOptions
+
+# Seconds of CPU time between samples
+DEFAULT_INTERVAL = 0.001
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of the Virtual Machine on a CPU timer signal.
+
+    Unlike the Profiler no handler is wrapped, the signal handler only reads the function id of every
+    frame in `context_memory`, so a sampled run keeps the JIT and costs about the same as a normal one.
+    Stacks are exported in the collapsed format of flame graph tools: `main;fib_r;fib_r 42`.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples: Dict[Tuple[str, ...], int] = {}
+        self._frames = None
+        self._previous_handler = None
+
+    @staticmethod
+    def supported() -> bool:
+        return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+    def start(self, frames: List):
+        """Starts sampling the frames stack, frames are anything with an `id_`"""
+        if not self.supported():
+            raise RuntimeError('Sampling needs interval timer signals, not available on this platform')
+
+        self._frames = frames
+        self._previous_handler = signal.signal(signal.SIGPROF, self.__sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        if self._frames is None:
+            return
+
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self._frames = None
+
+    def __sample(self, signal_number, frame):
+        stack = tuple([context.id_ for context in self._frames])
+        if stack:
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    @property
+    def sample_count(self):
+        return sum(self.samples.values())
+
+    def collapsed(self) -> List[str]:
+        return [f'{";".join(stack)} {count}' for stack, count in sorted(self.samples.items())]
+
+    def dump(self, filename: str):
+        with open(filename, 'w') as file:
+            for line in self.collapsed():
+                file.write(line + '\n')
+
+    def report(self) -> str:
+        """Samples where the function was on top of the stack (self) or anywhere in it (total)"""
+        own: Dict[str, int] = {}
+        total: Dict[str, int] = {}
+        for stack, count in self.samples.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for id_ in set(stack):
+                total[id_] = total.get(id_, 0) + count
+
+        sample_count = self.sample_count or 1
+        rows = [[id_, f'{own.get(id_, 0):,}', f'{total[id_]:,}', f'{own.get(id_, 0) / sample_count * 100:.1f}']
+                for id_ in sorted(total, key=lambda id_: own.get(id_, 0), reverse=True)]
+        return make_table(f'Samples ({self.sample_count:,} every {self.interval * 1000:g} ms)',
+                          ['FUNCTION', 'SELF', 'TOTAL', 'SELF %'], rows, TableOptions(16, 20))
@@ -0,0 +1,377 @@
+import sys
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src.compiler.code_generator.type import OperationType
+from src.compiler.stack_allocator.helpers import Layers
+from src.compiler.stack_allocator.types import ValueType
+from src.virtual_machine.memory_layout import AddressResolver, DEFAULT_LAYOUT, MemoryLayout
+from src.virtual_machine.types import FunctionData, Instruction, PointerAction
+
+# Python's default recursion limit is far below the call depth the interpreter supports
+RECURSION_LIMIT = 20000
+
+BINARY_OPERATORS = {
+    OperationType.ADD_INT: '+',
+    OperationType.ADD_FLOAT: '+',
+    OperationType.SUBTRACT_INT: '-',
+    OperationType.SUBTRACT_FLOAT: '-',
+    OperationType.MULTIPLY_INT: '*',
+    OperationType.MULTIPLY_FLOAT: '*',
+    OperationType.AND: 'and',
+    OperationType.OR: 'or',
+    OperationType.EQUAL: '==',
+    OperationType.NOT_EQUAL: '!=',
+    OperationType.LESS_THAN: '<',
+    OperationType.GREAT_THAN: '>',
+    OperationType.LESS_EQUAL: '<=',
+    OperationType.GREAT_EQUAL: '>=',
+}
+
+GENERIC_ARITHMETIC = {
+    OperationType.ADD: '+',
+    OperationType.SUBTRACT: '-',
+    OperationType.MULTIPLY: '*',
+}
+
+JUMPS = {OperationType.GOTO, OperationType.GOTOF, OperationType.GOTOV}
+
+
+class UnsupportedOperation(Exception):
+    """A quad has no Python translation, the program has to run in the interpreter"""
+
+
+class Transpiler:
+    """
+    Translates a loaded program into Python source, ahead of its execution.
+
+    Every typeton function becomes a Python function whose locals and temporaries are Python
+    local variables. Jumps are turned into a block-dispatch loop: each basic block is a branch
+    of a `while True` loop selected by the `block` variable. Globals live in the global frame
+    storage `g`, constants are inlined and heap access goes through the running Heap.
+    """
+
+    def __init__(self, quads: List[Instruction], function_data: Dict[str, FunctionData],
+                 resolvers: Dict[str, AddressResolver], constants: List, layout: MemoryLayout = DEFAULT_LAYOUT):
+        self._quads = quads
+        self._function_data = function_data
+        self._resolvers = resolvers
+        self._constants = constants
+
+        self._local_starts = {}
+        for layer, type_, start, _ in layout.blocks:
+            if layer is Layers.LOCAL:
+                self._local_starts[type_] = start
+
+        self._lines: List[str] = []
+        self._names: Set[str] = set()
+        self._calls: List[Tuple[str, int]] = []
+        self._call_count = 0
+
+    def transpile(self) -> str:
+        """Returns the Python source of the program, raises UnsupportedOperation if it can't be translated"""
+        self._lines = []
+
+        for id_, start, end in self.function_ranges():
+            if id_ == 'global':
+                self.__global_function(start, end)
+            else:
+                self.__function(id_, start, end)
+
+        self._lines.append('def program():')
+        self._lines.append('    global_init()')
+        self._lines.append('    f_main()')
+        return '\n'.join(self._lines) + '\n'
+
+    def function_ranges(self) -> List[Tuple[str, int, int]]:
+        """Returns (id, first quad, end quad) for every function, global quads come first"""
+        starts = sorted((data.start_quad, id_) for id_, data in self._function_data.items())
+        ranges = []
+        for index, (start, id_) in enumerate(starts):
+            end = starts[index + 1][0] if index + 1 < len(starts) else len(self._quads)
+            ranges.append((id_, start, end))
+        return ranges
+
+    # -- FUNCTIONS ------------------------------------
+
+    def __global_function(self, start, end):
+        resolver = self._resolvers['global']
+        self._names = set()
+
+        body = []
+        for index in range(start, end):
+            if self._quads[index].operation is OperationType.END_GLOBAL:
+                break
+            body.extend(self._quad(self._quads[index], resolver, index))
+
+        self._lines.append('def global_init():')
+        self._lines.extend('    ' + line for line in body)
+        self._lines.append('    return None')
+        self._lines.append('')
+
+    def __function(self, id_, start, end):
+        resolver = self._resolvers[id_]
+        self._names = set()
+        self._calls = []
+        self._call_count = 0
+        # a return only sets the value, the quads after it may still release blocks before ENDFUNC
+        if any(self._quads[index].operation is OperationType.RETURN for index in range(start, end)):
+            self._names.add('returned')
+
+        blocks = self.basic_blocks(start, end)
+        body = []
+        if len(blocks) == 1:
+            body.extend(self.__block(id_, resolver, blocks[0][0], blocks[0][1], end))
+        else:
+            body.append(f'block = {start}')
+            body.append('while True:')
+            for index, (block_start, block_end) in enumerate(blocks):
+                keyword = 'if' if index == 0 else 'elif'
+                body.append(f'    {keyword} block == {block_start}:')
+                body.extend('        ' + line for line in self.__block(id_, resolver, block_start, block_end, end))
+
+        parameters = self.__parameter_names(id_)
+        self._lines.append(f'def f_{id_}({", ".join(parameters)}):')
+        local_names = sorted(self._names - set(parameters))
+        if local_names:
+            self._lines.append('    ' + ' = '.join(local_names) + ' = None')
+        self._lines.extend('    ' + line for line in body)
+        self._lines.append('')
+
+    def __parameter_names(self, id_):
+        names = []
+        type_count = {}
+        for type_ in self._function_data[id_].parameter_signature:
+            count = type_count.get(type_, 0)
+            names.append(f'v{self._local_starts[type_] + count}')
+            type_count[type_] = count + 1
+        return names
+
+    def basic_blocks(self, start, end) -> List[Tuple[int, int]]:
+        """Splits the quads of a function at jump targets and after every jump"""
+        leaders = {start}
+        for index in range(start, end):
+            quad = self._quads[index]
+            if quad.operation in JUMPS:
+                leaders.add(quad.result)
+                leaders.add(index + 1)
+
+        leaders = sorted(leader for leader in leaders if start <= leader < end)
+        return [(leader, leaders[i + 1] if i + 1 < len(leaders) else end) for i, leader in enumerate(leaders)]
+
+    def __block(self, id_, resolver, start, end, function_end):
+        lines = []
+        for index in range(start, end):
+            quad = self._quads[index]
+
+            if quad.operation is OperationType.GOTO:
+                lines.append(f'block = {quad.result}')
+                return lines
+            if quad.operation is OperationType.GOTOF or quad.operation is OperationType.GOTOV:
+                condition = 'False' if quad.operation is OperationType.GOTOF else 'True'
+                lines.append(f'block = {quad.result} if {self._read(quad.left, resolver)} is {condition} '
+                             f'else {index + 1}')
+                return lines
+            if quad.operation is OperationType.ENDFUNC:
+                if id_ == 'main':
+                    lines.append('print("Main function ended")')
+                lines.append('return returned' if 'returned' in self._names else 'return None')
+                return lines
+
+            lines.extend(self._quad(quad, resolver, index))
+
+        lines.append(f'block = {end}' if end < function_end else 'return None')
+        return lines
+
+    # -- QUADS ----------------------------------------
+
+    def _quad(self, quad: Instruction, resolver: AddressResolver, index: int) -> List[str]:
+        operation = quad.operation
+
+        if operation in BINARY_OPERATORS:
+            value = f'({self._read(quad.left, resolver)} {BINARY_OPERATORS[operation]} ' \
+                    f'{self._read(quad.right, resolver)})'
+            return [self._write(quad.result, value, resolver)]
+
+        if operation in GENERIC_ARITHMETIC:
+            cast = 'float' if resolver.get_type(quad.result[1]) is ValueType.FLOAT else 'int'
+            value = f'({cast}({self._read(quad.left, resolver)}) {GENERIC_ARITHMETIC[operation]} ' \
+                    f'{cast}({self._read(quad.right, resolver)}))'
+            return [self._write(quad.result, value, resolver)]
+
+        if operation is OperationType.DIVIDE_INT or operation is OperationType.DIVIDE_FLOAT \
+                or operation is OperationType.DIVIDE:
+            is_float = operation is OperationType.DIVIDE_FLOAT or \
+                (operation is OperationType.DIVIDE and resolver.get_type(quad.result[1]) is ValueType.FLOAT)
+            divide = 'divide_float' if is_float else 'divide_int'
+            value = f'{divide}({self._read(quad.left, resolver)}, {self._read(quad.right, resolver)})'
+            return [self._write(quad.result, value, resolver)]
+
+        if operation is OperationType.ASSIGN or operation is OperationType.CALL_ASSIGN:
+            value = 'ret' if operation is OperationType.CALL_ASSIGN else self._read(quad.left, resolver)
+            return [self._write(quad.result, value, resolver)]
+
+        if operation is OperationType.POINTER_ADD:
+            value = f'({self._pointer_operand(quad.left, resolver)} + ' \
+                    f'{self._pointer_operand(quad.right, resolver)})'
+            return [self._write(quad.result, value, resolver)]
+
+        if operation is OperationType.VERIFY:
+            return [f'if not (0 <= {self._read(quad.left, resolver)} < {self._read(quad.result, resolver)}):',
+                    f"    stop('Array Index out of range')"]
+
+        if operation is OperationType.POINTER_ASSIGN:
+            if quad.left is not OperationType.ALLOCATE_HEAP:
+                raise UnsupportedOperation(operation)
+            # the quad is the allocation site, for the allocation report
+            element_type = 'None' if quad.element_type is None else f'ValueType.{quad.element_type.name}'
+            value = f'allocate({quad.right}, {quad.pointer_offsets!r}, {element_type}, {index})'
+            # allocating may move heap blocks, so the pointer being written is read afterwards
+            action, address = quad.result
+            if action is not None:
+                return [f'allocated = {value}', self._write(quad.result, 'allocated', resolver)]
+            return [f'{self._storage(address, resolver)} = {value}']
+
+        if operation is OperationType.DELETE_REF:
+            return [f'release({self._read((PointerAction.REFERENCE, quad.result[1]), resolver)})']
+
+        if operation is OperationType.PRINT:
+            return [f'print({self._read(quad.result, resolver)})']
+
+        if operation is OperationType.INPUT:
+            type_ = resolver.get_type(quad.result[1])
+            return [self._write(quad.result, f'read_input(ValueType.{type_.name})', resolver)]
+
+        if operation is OperationType.ARE:
+            self._calls.append((quad.result, self._call_count))
+            self._call_count += 1
+            return []
+
+        if operation is OperationType.PARAM:
+            _, call = self._calls[-1]
+            name = f'c{call}_{quad.right}'
+            self._names.add(name)
+            return [f'{name} = {self._read(quad.left, resolver)}']
+
+        if operation is OperationType.GOSUB:
+            callee, call = self._calls.pop()
+            arguments = []
+            for index in range(len(self._function_data[callee].parameter_signature)):
+                name = f'c{call}_{index}'
+                arguments.append(name if name in self._names else 'None')
+            self._names.add('ret')
+            return [f'ret = f_{callee}({", ".join(arguments)})']
+
+        if operation is OperationType.RETURN:
+            return [f'returned = {self._read(quad.result, resolver)}']
+
+        raise UnsupportedOperation(operation)
+
+    # -- OPERANDS -------------------------------------
+
+    def _storage(self, address, resolver: AddressResolver):
+        layer, _, index = resolver.resolve(address)
+        if layer is Layers.GLOBAL:
+            return f'g[{self._resolvers["global"].resolve(address)[2]}]'
+        if layer is Layers.CONSTANT:
+            raise UnsupportedOperation('constant storage')
+
+        name = f'v{address}'
+        self._names.add(name)
+        return name
+
+    def _read(self, operand, resolver: AddressResolver):
+        action, address = operand
+        layer, type_, index = resolver.resolve(address)
+
+        if layer is Layers.CONSTANT:
+            return repr(self._constants[index])
+
+        storage = self._storage(address, resolver)
+        if type_ is ValueType.POINTER and action is not PointerAction.REFERENCE:
+            return f'get_value({storage})'
+        return storage
+
+    def _write(self, operand, value, resolver: AddressResolver):
+        action, address = operand
+        type_ = resolver.get_type(address)
+
+        storage = self._storage(address, resolver)
+        if type_ is ValueType.POINTER and action is not PointerAction.REFERENCE:
+            return f'set_value({storage}, {value})'
+        return f'{storage} = {value}'
+
+    def _pointer_operand(self, operand, resolver: AddressResolver):
+        """Pointer arithmetic operands without a pointer action are literal offsets"""
+        action, value = operand
+        if action is None:
+            return str(value)
+        return self._read(operand, resolver)
+
+
+def runtime_namespace(global_storage: List, object_heap, stop: Callable[[str], None]) -> Dict:
+    """Globals the generated code runs with, its helpers behave like the matching interpreter handlers"""
+
+    def divide_int(left, right):
+        if right == 0 or left == 0:
+            stop('Division by zero')
+        return int(int(left) / int(right))
+
+    def divide_float(left, right):
+        if right == 0 or left == 0:
+            stop('Division by zero')
+        return float(left) / float(right)
+
+    def read_input(type_):
+        result = input()
+        if type_ is ValueType.INT or type_ is ValueType.FLOAT:
+            if not result.isnumeric():
+                stop('Invalid input')
+            return int(result) if type_ is ValueType.INT else float(result)
+        return result
+
+    return {
+        'g': global_storage,
+        'get_value': object_heap.get_value,
+        'set_value': object_heap.set_value,
+        'allocate': object_heap.allocate_reference,
+        'release': object_heap.release_heap_memory,
+        'stop': stop,
+        'divide_int': divide_int,
+        'divide_float': divide_float,
+        'read_input': read_input,
+        'ValueType': ValueType,
+    }
+
+
+def is_uninitialised_read(error: TypeError) -> bool:
+    """Compiled code reads uninitialised values as None, operating on them raises a TypeError naming it"""
+    return 'NoneType' in str(error)
+
+
+def compile_program(transpiler: Transpiler, global_storage: List, object_heap,
+                    stop: Callable[[str], None]) -> Optional[Callable[[], None]]:
+    """Transpiles and compiles the program, returns None when it has to run in the interpreter instead"""
+    try:
+        source = transpiler.transpile()
+    except UnsupportedOperation:
+        return None
+
+    namespace = runtime_namespace(global_storage, object_heap, stop)
+    exec(compile(source, '<typeton>', 'exec'), namespace)
+    program = namespace['program']
+
+    def run():
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, RECURSION_LIMIT))
+        try:
+            program()
+        except TypeError as error:
+            if not is_uninitialised_read(error):
+                raise
+            stop('Cannot perform operation on uninitialised values')
+        except RecursionError:
+            stop('Stack overflow')
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+    return run
@@ -3,11 +3,11 @@ from enum import Enum
 from src.utils.observer import Event, Publisher
 from typing import Dict, List
 
-from src.compiler.stack_allocator.helpers import Layers, init_types, get_segment, get_resource, Segment
-from src.compiler.stack_allocator.types import ValueType, DEFAULT_TYPES, TypeRange
-from src.compiler.symbol_table.constant_table import ConstantTable
+from src.compiler.stack_allocator.helpers import Layers
+from src.compiler.stack_allocator.types import ValueType
 from src.config.definitions import HEAP_RANGE_SIZE
 from src.virtual_machine.heap_memory import Heap
+from src.virtual_machine.memory_layout import AddressResolver
 
 
 class PointerAction(Enum):
@@ -87,159 +87,143 @@ class FunctionData:
         return result[:-1]
 
 
-def init_storage(size):
-    return [None] * size
-
-# TODO get heap start
-
-
 class ContextMemory(Publisher):
-    """Memory stores exact amount of needed spaces for a specific function"""
-
-    # TODO move size_data init_types to outside of ContextMemory
+    """Memory stores exact amount of needed spaces for a specific function, inside a single list"""
 
-    def __init__(self, size_data: SizeData, constant_data: ConstantTable,
+    def __init__(self, id_: str, resolver: AddressResolver, constant_data: List,
                  global_data, object_heap: Heap):
+        self.id_ = id_
         self.pending_return_value = None
-        self.type_data = init_types(DEFAULT_TYPES, is_runtime=True)
-        self.size_data = size_data
+        self.resolver = resolver
         self.object_heap = object_heap
-        # TODO removed double mapping and use offset from known segment ranges
-        self.data_storage: Dict[ValueType, List] = {}
+        self.storage: List = list(resolver.blank_frame)
+
+        self._blocks = resolver.blocks
+        self._block_index = resolver.block_index
 
         # Needed because these two are global
         self.global_data = global_data
         self.constant_data = constant_data
 
-        self.__init_storage()
-
     def display(self):
-        print("Ints", self.data_storage[ValueType.INT])
-        print("Float", self.data_storage[ValueType.FLOAT])
-        print("Bool", self.data_storage[ValueType.BOOL])
-        print("String", self.data_storage[ValueType.STRING])
-
-    def get_type(self, address):
-        _, address = pure_address(address)
-        segment = get_segment(address, self.type_data)
-        type_data: TypeRange = get_resource(address, segment)
-        return type_data.type_
-
-    def __init_storage(self):
-        self.data_storage[ValueType.INT] = init_storage(self.size_data.get_data(ValueType.INT).total)
-        self.data_storage[ValueType.FLOAT] = init_storage(self.size_data.get_data(ValueType.FLOAT).total)
-        self.data_storage[ValueType.BOOL] = init_storage(self.size_data.get_data(ValueType.BOOL).total)
-        self.data_storage[ValueType.STRING] = init_storage(self.size_data.get_data(ValueType.STRING).total)
-        self.data_storage[ValueType.POINTER] = init_storage(self.size_data.get_data(ValueType.POINTER).total)
-
-    def get_offset(self, address, segment: Segment, type_data: TypeRange):
-        """Get offset based on address segment range to store in exact array"""
-        offset = address - type_data.start
-        if segment.type_ is Layers.TEMPORARY:
-            offset += self.size_data.get_data(type_data.type_).local
-
-        return offset
+        print(self.id_, self.storage)
+
+    def get_type(self, operand):
+        _, address = operand
+        return self.resolver.get_type(address)
+
+    def reset(self):
+        """Clears every slot so the frame can be reused by another call"""
+        self.storage[:] = self.resolver.blank_frame
 
     def is_global(self):
         return self.global_data == None
 
     def release_reference(self, address):
         """Release reference to object"""
-        # print('starting release of memory ')
-        self.object_heap.release_heap_memory(self.get(f'&{address}'))
-        # print('finished release of memory ')
+        self.object_heap.release_heap_memory(self.get((PointerAction.REFERENCE, address)))
 
     def save_reference(self, address, value):
         """Save value to pointer"""
+        layer, _, base = self._blocks[self._block_index[address]]
 
-        # print("saving to pointer address", address, value)
+        if layer is Layers.GLOBAL and self.global_data is not None:
+            return self.global_data.save_reference(address, value)
 
-        segment = get_segment(address, self.type_data)
+        self.storage[address + base] = value
 
-        if segment.type_ is Layers.GLOBAL and not self.is_global():
-            return self.global_data.save_reference(address, value)
+    def save(self, operand, value):
+        """Deduce type and store in corresponding slot"""
+        action, address = operand
+        layer, type_, base = self._blocks[self._block_index[address]]
 
-        type_data: TypeRange = get_resource(address, segment)
-        slot = self.data_storage[type_data.type_]
-        offset = self.get_offset(address, segment, type_data)
+        if layer is Layers.GLOBAL and self.global_data is not None:
+            self.global_data.save(operand, value)
+            return
 
-        slot[offset] = value
+        if type_ is ValueType.POINTER and action is not PointerAction.REFERENCE:
+            self.object_heap.set_value(self.storage[address + base], value)
+            return
 
-    def save(self, address, value):
-        """Deduce type and store in corresponding array slot"""
-        action, pure_addr = pure_address(address)
+        self.storage[address + base] = value
 
-        segment = get_segment(pure_addr, self.type_data)
-        type_data: TypeRange = get_resource(pure_addr, segment)
+    def map_parameter(self, argument_value, parameter_index):
+        """Map parameters from previous context to current local context"""
+        self.storage[self.resolver.parameter_indexes[parameter_index]] = argument_value
 
-        if segment.type_ is Layers.GLOBAL and not self.is_global():
-            self.global_data.save(address, value)
-            return
+    def get(self, operand):
+        """Get from address origin, be it global, local, or constant table"""
+        action, address = operand
+        layer, type_, base = self._blocks[self._block_index[address]]
 
-        slot = self.data_storage[type_data.type_]
-        offset = self.get_offset(pure_addr, segment, type_data)
+        if layer is Layers.GLOBAL and self.global_data is not None:
+            return self.global_data.get(operand)
 
-        if type_data.type_ is ValueType.POINTER:
-            if action is PointerAction.REFERENCE:
-                slot[offset] = value
-                return
-            elif action is PointerAction.VALUE or action is None:
-                # print('saving value from pointer', address,
-                #       "actual address", slot[offset], 'for value', value)
-                self.object_heap.set_value(slot[offset], value)
-                return
+        if layer is Layers.CONSTANT:
+            return self.constant_data[address + base]
 
-        slot[offset] = value
+        # else get from local memory
+        value = self.storage[address + base]
 
-    def map_parameter(self, argument_value, argument_address, parameter_index):
-        """Map parameters from previous context to current local context"""
-        segment = get_segment(argument_address, self.type_data)
-        type_data: TypeRange = get_resource(argument_address, segment)
+        if type_ is ValueType.POINTER and action is not PointerAction.REFERENCE:
+            return self.object_heap.get_value(value)
 
-        slot = self.data_storage[type_data.type_]
-        slot[parameter_index] = argument_value
+        return value
 
-    def get(self, address):
-        """Get from address origin, be it global, local, or constant table"""
-        action, pure_addr = pure_address(address)
 
-        segment = get_segment(pure_addr, self.type_data)
-        type_data: TypeRange = get_resource(pure_addr, segment)
+class FramePool:
+    """Recycles the ContextMemory frames of a function, so calls don't rebuild their memory every time"""
 
-        if segment.type_ is Layers.GLOBAL and not self.is_global():
-            return self.global_data.get(address)
+    def __init__(self, id_: str, resolver: AddressResolver, constant_data: List,
+                 global_data: ContextMemory, object_heap: Heap):
+        self.id_ = id_
+        self.resolver = resolver
+        self.constant_data = constant_data
+        self.global_data = global_data
+        self.object_heap = object_heap
+        self._free: List[ContextMemory] = []
 
-        if segment.type_ is Layers.CONSTANT:
-            const = self.constant_data.get_from_address(f'{pure_addr}')
-            return const
+    def acquire(self) -> ContextMemory:
+        if self._free:
+            return self._free.pop()
 
-        # else get from local memory
-        slot = self.data_storage[type_data.type_]
-        offset = self.get_offset(pure_addr, segment, type_data)
+        return ContextMemory(self.id_, self.resolver, self.constant_data, self.global_data, self.object_heap)
 
-        if type_data.type_ is ValueType.POINTER:
-            # print("getting pointer", address, slot[offset])
-            if action is PointerAction.REFERENCE:
-                return slot[offset]
-            else:
-                return self.object_heap.get_value(slot[offset])
+    def release(self, frame: ContextMemory):
+        frame.reset()
+        self._free.append(frame)
 
-        return slot[offset]
 
+class Instruction:
+    """Quad with its address operands decoded into (PointerAction, address) pairs, built once at load time"""
 
-def pointer_type(address):
-    # return pointer type using enum by checking if the first char is a '&' or a '*'
-    if address[0] == '&':
-        return PointerAction.REFERENCE, int(address[1:])
-    elif address[0] == '*':
-        return PointerAction.VALUE, int(address[1:])
+    __slots__ = ('operation', 'left', 'right', 'result', 'pointer_offsets', 'element_type')
 
+    def __init__(self, operation, left=None, right=None, result=None):
+        self.operation = operation
+        self.left = left
+        self.right = right
+        self.result = result
+        # pointer fields and array element type of the block an ALLOCATE_HEAP quad allocates
+        self.pointer_offsets = ()
+        self.element_type = None
 
-def pure_address(address):
+    def display(self, index):
+        print('{:3}. {:<5} {:<5} {:<5} {:<5}'.format(index,
+                                                     self.operation.value,
+                                                     str(self.left) if self.left is not None else '',
+                                                     str(self.right) if self.right is not None else '',
+                                                     str(self.result) if self.result is not None else ''))
+
+
+def decode_address(address):
+    """Splits an encoded address ('&1234', '*1234' or 1234) into its pointer action and integer address"""
+    if address is None:
+        return None
     if type(address) is int:
         return None, address
-    # return pure address without pointer type
-    elif address[0] == '&':
+    if address[0] == '&':
         return PointerAction.REFERENCE, int(address[1:])
     elif address[0] == '*':
         return PointerAction.VALUE, int(address[1:])
+    return None, int(address)
@@ -2,62 +2,77 @@ from enum import Enum
 from operator import le
 import sys
 import timeit
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional, Tuple
 
-import jsonpickle
+from src.virtual_machine.allocation_tracker import AllocationTracker
+from src.virtual_machine.compactor import HeapCompactor
+from src.virtual_machine.garbage_collector import GarbageCollector
 from src.virtual_machine.heap_memory import Heap, RuntimeActions
 
 from src.compiler.stack_allocator.types import ValueType
-from src.compiler.code_generator.type import Quad, OperationType
-from src.compiler.output import OutputFile
-from src.compiler.symbol_table.constant_table import ConstantTable
+from src.compiler.code_generator.type import OperationType
+from src.compiler.output import OutputFile, decode_program
 from src.utils.observer import Event, Subscriber
-from src.virtual_machine.types import ContextMemory, FunctionData, PointerAction, pure_address
-
-EXPRESSIONS = {OperationType.ADD, OperationType.DIVIDE,
-               OperationType.MULTIPLY, OperationType.SUBTRACT}
-
-POINTER_EXPRESSIONS = {
-    OperationType.POINTER_ADD,
-    OperationType.DELETE_REF
-}
-
-ARRAYS = {
-    OperationType.VERIFY,
-    OperationType.ARRAY_ADD
+from src.virtual_machine.jit import JIT_THRESHOLD, RegionCompiler
+from src.virtual_machine.memory_layout import AddressResolver, build_constant_pool
+from src.virtual_machine.profiler import Profiler
+from src.virtual_machine.sampler import SamplingProfiler
+from src.virtual_machine.transpiler import Transpiler, compile_program, is_uninitialised_read
+from src.virtual_machine.types import ContextMemory, FramePool, FunctionData, Instruction, PointerAction, decode_address
+
+
+# Which quad fields (left, right, result) hold memory addresses, every other field is a literal
+# (jump targets, function ids, parameter indexes, allocation sizes)
+BINARY_OPERANDS = (True, True, True)
+NO_OPERANDS = (False, False, False)
+
+ADDRESS_OPERANDS = {
+    OperationType.ADD: BINARY_OPERANDS,
+    OperationType.SUBTRACT: BINARY_OPERANDS,
+    OperationType.MULTIPLY: BINARY_OPERANDS,
+    OperationType.DIVIDE: BINARY_OPERANDS,
+    OperationType.ADD_INT: BINARY_OPERANDS,
+    OperationType.ADD_FLOAT: BINARY_OPERANDS,
+    OperationType.SUBTRACT_INT: BINARY_OPERANDS,
+    OperationType.SUBTRACT_FLOAT: BINARY_OPERANDS,
+    OperationType.MULTIPLY_INT: BINARY_OPERANDS,
+    OperationType.MULTIPLY_FLOAT: BINARY_OPERANDS,
+    OperationType.DIVIDE_INT: BINARY_OPERANDS,
+    OperationType.DIVIDE_FLOAT: BINARY_OPERANDS,
+    OperationType.AND: BINARY_OPERANDS,
+    OperationType.OR: BINARY_OPERANDS,
+    OperationType.EQUAL: BINARY_OPERANDS,
+    OperationType.NOT_EQUAL: BINARY_OPERANDS,
+    OperationType.LESS_THAN: BINARY_OPERANDS,
+    OperationType.GREAT_THAN: BINARY_OPERANDS,
+    OperationType.LESS_EQUAL: BINARY_OPERANDS,
+    OperationType.GREAT_EQUAL: BINARY_OPERANDS,
+    OperationType.POINTER_ADD: BINARY_OPERANDS,
+    OperationType.DELETE_REF: (False, False, True),
+    OperationType.VERIFY: (True, False, True),
+    OperationType.ARRAY_ADD: (False, True, True),
+    OperationType.GOTOF: (True, False, False),
+    OperationType.GOTOV: (True, False, False),
+    OperationType.PARAM: (True, False, False),
+    OperationType.RETURN: (False, False, True),
+    OperationType.CALL_ASSIGN: (False, False, True),
+    OperationType.PRINT: (False, False, True),
+    OperationType.INPUT: (False, False, True),
+    OperationType.POINTER_ASSIGN: (True, False, True),
+    OperationType.ASSIGN: (True, False, True),
 }
 
-BOOLEAN_EXPRESSIONS = {
-    OperationType.AND,
-    OperationType.OR,
-    OperationType.LESS_THAN,
-    OperationType.LESS_THAN,
-    OperationType.EQUAL,
-    OperationType.LESS_EQUAL,
-    OperationType.GREAT_THAN,
-    OperationType.GREAT_EQUAL,
-    OperationType.NOT_EQUAL
-}
-
-JUMPS = {
-    OperationType.GOTO,
-    OperationType.GOTOF,
-    OperationType.GOTOV,
-}
 
-BUILT_IN = {
-    OperationType.PRINT,
-    OperationType.INPUT
-}
+def decode_quad(operation: OperationType, left, right, result) -> Instruction:
+    """Wraps the plain integer addresses of a loaded quad as (None, address), like its pointer operands"""
+    is_left, is_right, is_result = ADDRESS_OPERANDS.get(operation, NO_OPERANDS)
 
-FUNCTIONS = {
-    OperationType.PARAM,
-    OperationType.ENDFUNC,
-    OperationType.ARE,
-    OperationType.GOSUB,
-    OperationType.RETURN,
-    OperationType.CALL_ASSIGN
-}
+    return Instruction(
+        operation,
+        (None, left) if is_left and type(left) is int else left,
+        (None, right) if is_right and type(right) is int else right,
+        (None, result) if is_result and type(result) is int else result
+    )
 
 
 def _execute_typed_multiply(result_type, left_value, right_value):
@@ -83,12 +98,30 @@ class VirtualMachine(Subscriber):
         super().__init__()
         self._ip = 0  # instruction pointer
         self.operation_count = 0
-
-        self._constant_table: ConstantTable = ConstantTable()
-        self._quads: Quad = None
+        # seconds spent executing quads in the last run, without loading the program
+        self.run_seconds = 0.0
+
+        self._constant_table: Dict[int, Any] = {}
+        self._source = None
+        self._lines: List[int] = []
+        self._running_compiled = False
+        self._constants: List = []
+        self._quads: List[Instruction] = None
+        self._handlers: List[Callable[[Instruction], None]] = []
         self._function_data: Dict[str, FunctionData] = {}
+        self._resolvers: Dict[str, AddressResolver] = {}
+        self._frame_pools: Dict[str, FramePool] = {}
         self.pending_return = []
         self.object_heap: Heap = None
+        self._collector: GarbageCollector = None
+        self._compactor: HeapCompactor = None
+
+        # tiered execution, hot loops and functions are compiled by the region compiler
+        self._region_compiler: RegionCompiler = None
+        # (GOTO or GOSUB, first quad) -> runs, a function entry may also be a loop header
+        self._hotness: Dict[Tuple[OperationType, int], int] = {}
+        # function id -> (first quad, end quad)
+        self._function_ranges: Dict[str, Tuple[int, int]] = {}
 
         self._memory = {}
         self.context_memory: List[ContextMemory] = []
@@ -96,97 +129,257 @@ class VirtualMachine(Subscriber):
         self.context_jump_locations = []
         self.global_memory = None
 
+        self._dispatch_table = self.__build_dispatch_table()
+
     def handle_event(self, event: Event):
         if event.type_ == RuntimeActions.STOP_RUNTIME:
+            # compiled code doesn't keep the instruction pointer up to date
+            location = None if self._running_compiled else self.location(self._ip)
             print()
-            print(f'💀 Runtime Error: {event.payload}')
+            print(f'💀 Runtime Error: {event.payload}' + (f' ({location})' if location else ''))
             self._stop()
+        elif event.type_ == RuntimeActions.COLLECT_GARBAGE and self._collector is not None:
+            self._collector.collect(self.object_heap, self.__heap_roots())
+        elif event.type_ == RuntimeActions.COMPACT_HEAP and self._compactor is not None:
+            if self._compactor.should_compact(event.payload):
+                self._compactor.compact(self.object_heap, self.__pointer_slots(), [event.payload])
+
+    def __pointer_slots(self):
+        """Slots that may hold heap addresses: pointers of every live frame, and values returned but not assigned yet"""
+        for frame in [self.global_memory, *self.context_memory, *self.context_pending_assigment]:
+            yield frame.storage, frame.resolver.pointer_slots
+        yield self.pending_return, slice(None)
+
+    def __heap_roots(self):
+        for storage, pointer_slots in self.__pointer_slots():
+            yield from storage[pointer_slots]
+
+    def compact_heap(self) -> int:
+        """Compacts every heap space now, returns the cells joined to the free space at their end"""
+        compactor = self._compactor or HeapCompactor()
+        return compactor.compact(self.object_heap, self.__pointer_slots())
+
+    def location(self, ip) -> Optional[str]:
+        """Returns 'file:line' of the source that generated the quad, None if unknown"""
+        line = self._lines[ip] if 0 <= ip < len(self._lines) else 0
+        if not line:
+            return None
+        return f'{self._source or "<program>"}:{line}'
 
     def __init_global_function(self):
-        size_data = self._function_data["global"].size_data
         self.global_memory = ContextMemory(
-            size_data, self._constant_table, None, self.object_heap)
+            "global", self._resolvers["global"], self._constants, None, self.object_heap)
         self.context_memory = []
 
-    def run(self, json_data):
-
-        self._load(json_data)
+        for id_, function_data in self._function_data.items():
+            self._frame_pools[id_] = FramePool(
+                id_, self._resolvers[id_], self._constants, self.global_memory, self.object_heap)
+
+    def run(self, program, compiled=False, jit=True, profiler: Profiler = None, sampler: SamplingProfiler = None,
+            collector: GarbageCollector = None, compactor: HeapCompactor = None, tracker: AllocationTracker = None):
+        """
+        Runs the program, encoded (.tyc bytes or any buffer) or already decoded. With `compiled` it is
+        transpiled to Python first when every quad supports it. Otherwise it is interpreted and, with `jit`, hot loops and functions get compiled as they run.
+        A `profiler` measures every quad, so it always runs in the interpreter without compiling.
+        A `sampler` reads the call stack from the frames, which compiled programs don't keep, so it
+        disables `compiled` but not the JIT, since compiled regions never span a call.
+        A `collector` frees the heap blocks no frame reaches, and a `compactor` moves blocks together when the
+        heap fragments. Both need the frames, so they disable `compiled`.
+        A `tracker` records the quad that allocated every heap block, to report the ones left at the end.
+        """
+
+        self._load(program)
+        self._collector = collector
+        self._compactor = compactor
+        if collector is not None:
+            collector.attach(self.object_heap)
+        if tracker is not None:
+            tracker.attach(self.object_heap, self.location)
         self.__init_global_function()
-        self.context_memory.append(
-            ContextMemory(self._function_data["main"].size_data, self._constant_table, self.global_memory, self.object_heap))
+        self.context_memory.append(self._frame_pools["main"].acquire())
 
         self._ip = 0
+        program = None
+        if profiler is not None:
+            for id_, function_data in self._function_data.items():
+                profiler.locate_function(id_, self.location(function_data.start_quad))
+            self._handlers = [profiler.wrap(quad.operation, handler, self.location(ip))
+                              for ip, (quad, handler) in enumerate(zip(self._quads, self._handlers))]
+        else:
+            needs_frames = sampler is not None or collector is not None or compactor is not None
+            program = self.__compile() if compiled and not needs_frames else None
+            if program is None and jit:
+                self.__init_region_compiler()
 
         print('--- Start execution -------------------------')
         print(f'\n\n')
 
+        quads = self._quads
+        handlers = self._handlers
+        quad_count = len(quads)
+
         start = timeit.default_timer()
-        while self._ip < len(self._quads):
-            quad = self._quads[self._ip]
-            self._execute(quad)
-            self.operation_count += 1
+        if profiler is not None:
+            profiler.enter("main")
+        if sampler is not None:
+            sampler.start(self.context_memory)
+        try:
+            if program is not None:
+                self._running_compiled = True
+                program()
+            else:
+                while self._ip < quad_count:
+                    ip = self._ip
+                    handlers[ip](quads[ip])
+                    self.operation_count += 1
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if profiler is not None:
+                profiler.finish()
         stop = timeit.default_timer()
+        self.run_seconds = stop - start
         operations = "{:,}".format(self.operation_count)
-        time = '{:.2f}'.format(stop)
+        time = '{:.2f}'.format(stop - start)
         print(f'\n\n')
         print("--- End execution ---------------------------")
         print()
-        print(f'{operations} operations in {time} seconds')
+        if program is not None:
+            print(f'compiled program ran in {time} seconds')
+        else:
+            print(f'{operations} operations in {time} seconds')
+
+    def __compile(self):
+        transpiler = Transpiler(self._quads, self._function_data, self._resolvers, self._constants)
+        return compile_program(transpiler, self.global_memory.storage, self.object_heap, self.__stop_runtime)
+
+    def __init_region_compiler(self):
+        self._region_compiler = RegionCompiler(
+            self._quads, self._function_data, self._resolvers, self._constants,
+            self.global_memory.storage, self.object_heap, self.pending_return, self.__stop_runtime)
+        self._function_ranges = {id_: (start, end) for id_, start, end in Transpiler(
+            self._quads, self._function_data, self._resolvers, self._constants).function_ranges()}
+
+    def __count_hotness(self, kind: OperationType, start, end):
+        """Counts one more run of the quads [start, end) entered by a `kind` jump, compiles them once they are hot"""
+        key = (kind, start)
+        hotness = self._hotness.get(key, 0)
+        if hotness >= JIT_THRESHOLD:
+            # compiled already, or left to the interpreter
+            return
+        hotness += 1
+        self._hotness[key] = hotness
+        if hotness < JIT_THRESHOLD:
+            return
+
+        id_ = next(id_ for id_, (function_start, function_end) in self._function_ranges.items()
+                   if function_start <= start < function_end)
+        if id_ == 'global':
+            return
+
+        region, leaders = self._region_compiler.compile_region(id_, start, end)
+        for leader in leaders:
+            self._handlers[leader] = self.__region_handler(region, leader)
+
+    def __region_handler(self, region, block):
+        def execute(quad):
+            self._running_compiled = True
+            try:
+                self._ip, count = region(self.context_memory[-1].storage, block)
+            except TypeError as error:
+                if not is_uninitialised_read(error):
+                    raise
+                self.__stop_runtime('Cannot perform operation on uninitialised values')
+            self._running_compiled = False
+            # the run loop counts the entry quad
+            self.operation_count += count - 1
+
+        return execute
+
+    def __stop_runtime(self, message):
+        self.handle_event(Event(RuntimeActions.STOP_RUNTIME, message))
 
     # -- LOAD DATA methods ----------------------------
 
-    def _load(self, json_data):
-        compiled_program: OutputFile = jsonpickle.decode(
-            json_data,
-            classes=(FunctionData, Quad, ConstantTable),
-            keys=True
-        )
+    def _load(self, program):
+        compiled_program: OutputFile = program if isinstance(program, OutputFile) else decode_program(program)
 
         self.object_heap = Heap(compiled_program.heap_start)
         self.object_heap.add_subscriber(self, {})
 
-        # Note: Keys are turned into strings for dictionaries when using JSON decode
-        self._constant_table = compiled_program.constant_table
-        self._quads = jsonpickle.decode(compiled_program.quad_list)
-
-        # complex objects require additional decoding
-        for key, value in compiled_program.function_data.items():
-            self._function_data[key] = jsonpickle.decode(value)
+        self._constant_table = compiled_program.constants
+        self._constants = build_constant_pool(self._constant_table)
+        self._quads = [decode_quad(*quad) for quad in compiled_program.quad_list]
+        for index, pointer_offsets in compiled_program.pointer_offsets.items():
+            self._quads[index].pointer_offsets = pointer_offsets
+        for index, element_type in compiled_program.element_types.items():
+            self._quads[index].element_type = element_type
+        self._source = compiled_program.source
+        self._lines = compiled_program.lines or []
+
+        self._function_data = compiled_program.function_data
+        for key, function_data in self._function_data.items():
+            self._resolvers[key] = AddressResolver(function_data)
+
+        self._handlers = self.__bind_handlers(self._quads)
+
+    def __build_dispatch_table(self) -> Dict[OperationType, Callable[[Instruction], None]]:
+        """Maps every executable operation to the method that runs it"""
+        return {
+            OperationType.POINTER_ADD: self.__execute_pointer_add,
+            OperationType.DELETE_REF: self.__execute_delete_reference,
+
+            OperationType.ADD: self.__execute_add,
+            OperationType.SUBTRACT: self.__execute_subtract,
+            OperationType.MULTIPLY: self.__execute_multiply,
+            OperationType.DIVIDE: self.__execute_divide,
+            OperationType.ADD_INT: self.__execute_add_typed,
+            OperationType.ADD_FLOAT: self.__execute_add_typed,
+            OperationType.SUBTRACT_INT: self.__execute_subtract_typed,
+            OperationType.SUBTRACT_FLOAT: self.__execute_subtract_typed,
+            OperationType.MULTIPLY_INT: self.__execute_multiply_typed,
+            OperationType.MULTIPLY_FLOAT: self.__execute_multiply_typed,
+            OperationType.DIVIDE_INT: self.__execute_divide_int,
+            OperationType.DIVIDE_FLOAT: self.__execute_divide_float,
+
+            OperationType.VERIFY: self.__execute_verify,
+            OperationType.ARRAY_ADD: self.__execute_array_add,
+
+            OperationType.AND: self.__execute_and,
+            OperationType.OR: self.__execute_or,
+            OperationType.EQUAL: self.__execute_equal,
+            OperationType.NOT_EQUAL: self.__execute_not_equal,
+            OperationType.LESS_THAN: self.__execute_less_than,
+            OperationType.GREAT_THAN: self.__execute_great_than,
+            OperationType.LESS_EQUAL: self.__execute_less_equal,
+            OperationType.GREAT_EQUAL: self.__execute_great_equal,
+
+            OperationType.GOTO: self.__execute_goto,
+            OperationType.GOTOF: self.__execute_gotof,
+            OperationType.GOTOV: self.__execute_gotov,
+
+            OperationType.PARAM: self.__execute_param,
+            OperationType.ENDFUNC: self.__execute_end_function,
+            OperationType.ARE: self.__execute_are,
+            OperationType.GOSUB: self.__execute_gosub,
+            OperationType.RETURN: self.__execute_return,
+            OperationType.CALL_ASSIGN: self.__execute_call_assign,
+
+            OperationType.PRINT: self.__execute_print,
+            OperationType.INPUT: self.__execute_input,
+
+            OperationType.POINTER_ASSIGN: self.__execute_pointer_assign,
+            OperationType.ASSIGN: self.__execute_assign_quad,
+            OperationType.END_GLOBAL: self.__execute_end_global,
+        }
+
+    def __bind_handlers(self, quads: List[Instruction]) -> List[Callable[[Instruction], None]]:
+        """Resolves the handler of every quad once, so execution is a single indexed call"""
+        dispatch_table = self._dispatch_table
+        return [dispatch_table.get(quad.operation, self.__execute_unknown) for quad in quads]
 
     def _execute(self, quad):
-        operation = quad.operation
-
-        # quad.display(self._ip)
-
-        if operation in POINTER_EXPRESSIONS:
-            self.__pointer_expression(quad)
-        elif operation in EXPRESSIONS:
-            self.__execute_expression(quad)
-
-        elif operation in ARRAYS:
-            self.__execute_array_call(quad)
-        elif operation in BOOLEAN_EXPRESSIONS:
-            self.__execute_boolean_expression(quad)
-        elif operation in JUMPS:
-            self.__execute_jump(quad)
-        elif operation in FUNCTIONS:
-            self.__execute_function_call(quad)
-        elif operation in BUILT_IN:
-            self.__execute_builtin_function(quad)
-        elif operation is OperationType.POINTER_ASSIGN:
-            self.__execute_pointer_assign(quad)
-            self._ip += 1
-
-        elif operation is OperationType.ASSIGN:
-            self.__execute_assign(quad.result_address,
-                                  self._get_value(quad.left_address))
-            self._ip += 1
-
-        elif operation is OperationType.END_GLOBAL:
-            self.go_to_main()
-        else:
-            print(f'Unknown Command {quad.operation}')
-            self._ip = len(self._quads) + 1
+        self._dispatch_table.get(quad.operation, self.__execute_unknown)(quad)
 
     # -- EXECUTION methods  ----------------------------
 
@@ -205,209 +398,311 @@ class VirtualMachine(Subscriber):
             return int(int(left_value) / int(right_value))
         return float(left_value) / float(right_value)
 
-    def __pointer_expression(self, quad):
+    def __execute_unknown(self, quad):
+        print(f'Unknown Command {quad.operation}')
+        self._ip = len(self._quads) + 1
 
-        if quad.operation is OperationType.DELETE_REF:
-            heap_ref = quad.result_address
-            self.context_memory[-1].release_reference(heap_ref)
+    def __execute_end_global(self, quad):
+        self.go_to_main()
 
-        elif quad.operation is OperationType.POINTER_ADD:
-            action_left, p_left = pure_address(quad.left_address)
-            action_right, p_right = pure_address(quad.right_address)
+    # Pointers
 
-            if action_left is not None:
-                p_left = self._get_value(quad.left_address)
-            if action_right is not None:
-                p_right = self._get_value(quad.right_address)
+    def __execute_delete_reference(self, quad):
+        self.context_memory[-1].release_reference(quad.result[1])
+        self._ip += 1
 
-            # print("left:", p_left, "right:", p_right)
+    def __execute_pointer_add(self, quad):
+        action_left, p_left = quad.left
+        action_right, p_right = quad.right
 
-            if p_left is None or p_right is None:
-                self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'NULL pointer exception'))
+        if action_left is not None:
+            p_left = self._get_value(quad.left)
+        if action_right is not None:
+            p_right = self._get_value(quad.right)
 
-            result = _execute_typed_add(ValueType.INT, p_left, p_right)
-            self.__execute_assign(quad.result_address, result)
+        if p_left is None or p_right is None:
+            self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'NULL pointer exception'))
 
+        result = _execute_typed_add(ValueType.INT, p_left, p_right)
+        self.__execute_assign(quad.result, result)
         self._ip += 1
 
-    def __execute_expression(self, quad):
-        left = self._get_value(quad.left_address)
-        right = self._get_value(quad.right_address)
-        type_ = self.context_memory[-1].get_type(quad.result_address)
-        result = 0
+    # Arithmetic
+
+    def __arithmetic_operands(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
 
         if left is None or right is None:
             self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Cannot perform operation on uninitialised values'))
-        if quad.operation is OperationType.ADD:
-            result = _execute_typed_add(type_, left, right)
-        if quad.operation is OperationType.SUBTRACT:
-            result = _execute_typed_subtract(type_, left, right)
-        elif quad.operation is OperationType.MULTIPLY:
-            result = _execute_typed_multiply(type_, left, right)
-        elif quad.operation is OperationType.DIVIDE:
-            result = self._execute_typed_divide(type_, left, right)
 
+        return self.context_memory[-1].get_type(quad.result), left, right
+
+    def __execute_add(self, quad):
+        type_, left, right = self.__arithmetic_operands(quad)
+        self._ip += 1
+        self.__execute_assign(quad.result, _execute_typed_add(type_, left, right))
+
+    def __execute_subtract(self, quad):
+        type_, left, right = self.__arithmetic_operands(quad)
+        self._ip += 1
+        self.__execute_assign(quad.result, _execute_typed_subtract(type_, left, right))
+
+    def __execute_multiply(self, quad):
+        type_, left, right = self.__arithmetic_operands(quad)
         self._ip += 1
-        self.__execute_assign(quad.result_address, result)
+        self.__execute_assign(quad.result, _execute_typed_multiply(type_, left, right))
 
-    def __execute_array_call(self, quad):
-        left = self._get_value(quad.left_address)
-        result = self._get_value(quad.result_address)
+    def __execute_divide(self, quad):
+        type_, left, right = self.__arithmetic_operands(quad)
+        self._ip += 1
+        self.__execute_assign(quad.result, self._execute_typed_divide(type_, left, right))
+
+    # Typed arithmetic: operand types were checked by the compiler, Python keeps Int + Int as int
+    # and promotes any Float operand, so values are used as they are
 
-        if quad.operation == OperationType.VERIFY:
-            if not(0 <= left < result):
-                self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Array Index out of range'))
-        elif quad.operation is OperationType.ARRAY_ADD:
-            value = _execute_typed_add(ValueType.INT, quad.left_address, self._get_value(quad.right_address))
-            action, addr = pure_address(quad.result_address)
-            self.context_memory[-1].save_reference(addr, value)
+    def __typed_operands(self, quad):
+        memory = self.context_memory[-1]
+        left = memory.get(quad.left)
+        right = memory.get(quad.right)
 
+        if left is None or right is None:
+            self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Cannot perform operation on uninitialised values'))
+
+        return left, right
+
+    def __execute_add_typed(self, quad):
+        left, right = self.__typed_operands(quad)
         self._ip += 1
+        self.context_memory[-1].save(quad.result, left + right)
 
-    def __execute_boolean_expression(self, quad):
-        left = self._get_value(quad.left_address)
-        right = self._get_value(quad.right_address)
-        result = 0
-
-        if quad.operation is OperationType.AND:
-            result = left and right
-        elif quad.operation is OperationType.OR:
-            result = left or right
-        elif quad.operation is OperationType.EQUAL:
-            result = left == right
-        elif quad.operation is OperationType.LESS_THAN:
-            result = left < right
-        elif quad.operation is OperationType.GREAT_THAN:
-            result = left > right
-        elif quad.operation is OperationType.LESS_EQUAL:
-            result = left <= right
-        elif quad.operation is OperationType.GREAT_EQUAL:
-            result = left >= right
-        elif quad.operation is OperationType.NOT_EQUAL:
-            result = left != right
+    def __execute_subtract_typed(self, quad):
+        left, right = self.__typed_operands(quad)
+        self._ip += 1
+        self.context_memory[-1].save(quad.result, left - right)
 
+    def __execute_multiply_typed(self, quad):
+        left, right = self.__typed_operands(quad)
         self._ip += 1
-        self.__execute_assign(quad.result_address, result)
+        self.context_memory[-1].save(quad.result, left * right)
 
-    def __execute_builtin_function(self, quad):
-        if quad.operation is OperationType.PRINT:
-            print(self._get_value(quad.result_address))
-        elif quad.operation is OperationType.INPUT:
-            result = input()
-            type_ = self.context_memory[-1].get_type(quad.result_address)
+    def __execute_divide_int(self, quad):
+        left, right = self.__typed_operands(quad)
+        if right == 0 or left == 0:
+            self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Division by zero'))
+        self._ip += 1
+        self.context_memory[-1].save(quad.result, int(left / right))
+
+    def __execute_divide_float(self, quad):
+        left, right = self.__typed_operands(quad)
+        if right == 0 or left == 0:
+            self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Division by zero'))
+        self._ip += 1
+        self.context_memory[-1].save(quad.result, left / right)
 
-            if type_ is ValueType.INT or type_ is ValueType.FLOAT:
-                if not result.isnumeric():
-                    self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Invalid input'))
+    # Arrays
 
-                if type_ == ValueType.INT:
-                    result = int(result)
-                elif type_ == ValueType.FLOAT:
-                    result = float(result)
+    def __execute_verify(self, quad):
+        left = self._get_value(quad.left)
+        result = self._get_value(quad.result)
 
-            self.__execute_assign(quad.result_address, result)
+        if not(0 <= left < result):
+            self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Array Index out of range'))
 
         self._ip += 1
 
-    def __execute_jump(self, quad):
-        if quad.operation is OperationType.GOTO:
-            self._ip = quad.result_address
-        elif quad.operation is OperationType.GOTOF:
-            if self._get_value(quad.left_address) is False:
-                self._ip = quad.result_address
-            else:
-                self._ip += 1
-        elif quad.operation is OperationType.GOTOV:
-            if self._get_value(quad.left_address) is True:
-                self._ip = quad.result_address
-            else:
-                self._ip += 1
+    def __execute_array_add(self, quad):
+        value = _execute_typed_add(ValueType.INT, quad.left, self._get_value(quad.right))
+        self.context_memory[-1].save_reference(quad.result[1], value)
+        self._ip += 1
 
-    def __execute_function_call(self, quad):
-        if quad.operation is OperationType.PARAM:
-            self._map_argument_to_parameter(
-                quad.left_address, quad.right_address)
-            self._ip += 1
-        elif quad.operation is OperationType.ENDFUNC:
-            if len(self.context_jump_locations) == 0:
-                self._delete_context_memory()
-                self._ip += 1
-                print("Main function ended")
-                return
-
-            self._ip = self.context_jump_locations.pop()
-            self._delete_context_memory()
-        elif quad.operation is OperationType.ARE:
-            self._assign_context_memory(quad.result_address)
+    # Boolean expressions
+
+    def __execute_and(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left and right)
+
+    def __execute_or(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left or right)
+
+    def __execute_equal(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left == right)
+
+    def __execute_not_equal(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left != right)
+
+    def __execute_less_than(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left < right)
+
+    def __execute_great_than(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left > right)
+
+    def __execute_less_equal(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left <= right)
+
+    def __execute_great_equal(self, quad):
+        left = self._get_value(quad.left)
+        right = self._get_value(quad.right)
+        self._ip += 1
+        self.__execute_assign(quad.result, left >= right)
+
+    # Built-in functions
+
+    def __execute_print(self, quad):
+        print(self._get_value(quad.result))
+        self._ip += 1
+
+    def __execute_input(self, quad):
+        result = input()
+        type_ = self.context_memory[-1].get_type(quad.result)
+
+        if type_ is ValueType.INT or type_ is ValueType.FLOAT:
+            if not result.isnumeric():
+                self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Invalid input'))
+
+            if type_ == ValueType.INT:
+                result = int(result)
+            elif type_ == ValueType.FLOAT:
+                result = float(result)
+
+        self.__execute_assign(quad.result, result)
+        self._ip += 1
+
+    # Jumps
+
+    def __execute_goto(self, quad):
+        # a backward jump closes a loop
+        if quad.result <= self._ip and self._region_compiler is not None:
+            self.__count_hotness(OperationType.GOTO, quad.result, self._ip + 1)
+        self._ip = quad.result
+
+    def __execute_gotof(self, quad):
+        if self._get_value(quad.left) is False:
+            self._ip = quad.result
+        else:
             self._ip += 1
-        elif quad.operation is OperationType.GOSUB:
-            self.context_memory.append(self.context_pending_assigment.pop())
-            self.context_jump_locations.append(self._ip + 1)
-            self._ip = self.get_function_start(quad.result_address)
-        elif quad.operation is OperationType.RETURN:
-            value = self._get_value(quad.result_address)
-            self.pending_return.append(value)
+
+    def __execute_gotov(self, quad):
+        if self._get_value(quad.left) is True:
+            self._ip = quad.result
+        else:
             self._ip += 1
-        elif quad.operation is OperationType.CALL_ASSIGN:
-            return_value = self.pending_return.pop()
-            self.context_memory[-1].save(quad.result_address, return_value)
+
+    # Functions
+
+    def __execute_param(self, quad):
+        self._map_argument_to_parameter(quad.left, quad.right)
+        self._ip += 1
+
+    def __execute_end_function(self, quad):
+        if len(self.context_jump_locations) == 0:
+            self._delete_context_memory()
             self._ip += 1
+            print("Main function ended")
+            return
 
-    def __allocate_heap_memory(self, size):
-        return self.object_heap.allocate_reference(size)
+        self._ip = self.context_jump_locations.pop()
+        self._delete_context_memory()
+
+    def __execute_are(self, quad):
+        self._assign_context_memory(quad.result)
+        self._ip += 1
+
+    def __execute_gosub(self, quad):
+        self.context_memory.append(self.context_pending_assigment.pop())
+        self.context_jump_locations.append(self._ip + 1)
+        self._ip = self.get_function_start(quad.result)
+        if self._region_compiler is not None:
+            self.__count_hotness(OperationType.GOSUB, self._ip, self._function_ranges[quad.result][1])
+
+    def __execute_return(self, quad):
+        self.pending_return.append(self._get_value(quad.result))
+        self._ip += 1
+
+    def __execute_call_assign(self, quad):
+        return_value = self.pending_return.pop()
+        self.context_memory[-1].save(quad.result, return_value)
+        self._ip += 1
+
+    # Assignment
+
+    def __allocate_heap_memory(self, quad):
+        return self.object_heap.allocate_reference(quad.right, quad.pointer_offsets, quad.element_type, self._ip)
 
     def __execute_pointer_assign(self, quad):
 
-        if quad.left_address is OperationType.ALLOCATE_HEAP:
-            p_left = self.__allocate_heap_memory(quad.right_address)
+        if quad.left is OperationType.ALLOCATE_HEAP:
+            p_left = self.__allocate_heap_memory(quad)
         else:
-            action_left, p_left = pure_address(quad.left_address)
+            action_left, p_left = quad.left
             if action_left is not None:
                 if action_left is PointerAction.REFERENCE:
                     # check that pointer to be assigned is actually initialized
-                    if self._get_value(f'*{p_left}') is None:
+                    if self._get_value((PointerAction.VALUE, p_left)) is None:
                         self.handle_event(Event(RuntimeActions.STOP_RUNTIME, 'Cannot assign to uninitialised value'))
-                    p_left = self._get_value(quad.left_address)
+                    p_left = self._get_value(quad.left)
+
+        self._ip += 1
 
-        action_res, _ = pure_address(quad.result_address)
+        action_res, address = quad.result
         if action_res is not None:
-            self.__execute_object_parameter_assign(quad.result_address, p_left)
+            self.__execute_object_parameter_assign(quad.result, p_left)
             return
 
         if p_left == -1:
             p_left = None
 
-        self.context_memory[-1].save_reference(quad.result_address, p_left)
+        self.context_memory[-1].save_reference(address, p_left)
+
+    def __execute_assign_quad(self, quad):
+        self.__execute_assign(quad.result, self._get_value(quad.left))
+        self._ip += 1
 
-    def __execute_object_parameter_assign(self, address, value):
-        self.context_memory[-1].save(address, value)
+    def __execute_object_parameter_assign(self, operand, value):
+        self.context_memory[-1].save(operand, value)
 
-    def __execute_assign(self, address, value):
-        # print(f'Assign {address} = {value}')
-        self.context_memory[-1].save(address, value)
+    def __execute_assign(self, operand, value):
+        self.context_memory[-1].save(operand, value)
 
-    def _get_value(self, address):
-        if address is not None:
-            return self.context_memory[-1].get(address)
+    def _get_value(self, operand):
+        if operand is not None:
+            return self.context_memory[-1].get(operand)
 
-    def _set_value(self, value, address):
+    def _set_value(self, value, operand):
         """ Sets value to specified address in memory """
-        self.context_memory[-1].save(address, value)
+        self.context_memory[-1].save(operand, value)
 
     # -- DEBUG methods ---------------------------
 
-    def _map_argument_to_parameter(self, argument_address, parameter_index):
+    def _map_argument_to_parameter(self, argument, parameter_index):
         previous_context = self.context_memory[-1]
-        argument_value = previous_context.get(argument_address)
+        argument_value = previous_context.get(argument)
 
         new_context = self.context_pending_assigment[-1]
-        new_context.map_parameter(
-            argument_value, argument_address, parameter_index)
+        new_context.map_parameter(argument_value, parameter_index)
 
     def _assign_context_memory(self, id_):
-        size_data = self._function_data[id_].size_data
-        ctx = ContextMemory(
-            size_data, self._constant_table, self.global_memory, self.object_heap)
+        ctx = self._frame_pools[id_].acquire()
         # don't assign until all parameters are calculated using previous era
         self.context_pending_assigment.append(ctx)
 
@@ -415,7 +710,8 @@ class VirtualMachine(Subscriber):
         return self._function_data[id_].start_quad
 
     def _delete_context_memory(self):
-        self.context_memory.pop()
+        frame = self.context_memory.pop()
+        self._frame_pools[frame.id_].release(frame)
 
     # def _map_param_value(self, ):
 